@@ -0,0 +1,87 @@
+"""
+Times MarkdownHighlighter on single long paragraphs of 1k to 10k words.
+
+Run from the repository root:
+    QT_QPA_PLATFORM=offscreen python benchmarks/highlighter_benchmark.py
+
+Spell verdicts are computed up front, so the timings cover the highlighting
+pass itself (rules, tokenizing and misspelling underlines), not the dictionary.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QTextDocument
+from PyQt6.QtCore import QThreadPool
+
+from tabula_writer.panels_qt.panel_components import MarkdownHighlighter, WORD_PATTERN
+
+WORDS = ("the quick brown fox jumps over a lazy dog while Marcus writes his chapter "
+         "about the river and the old house near the hill").split()
+SIZES = (1000, 2000, 5000, 10000)
+REPEATS = 3
+
+
+class FakeApp:
+    base_font_size = 18
+    threadpool = QThreadPool.globalInstance()
+
+
+THEME = {'link_beige': '#a89f81', 'accent_red': '#b23a3a'}
+
+
+def make_typo(rng):
+    """A made-up word, so most misspellings in a paragraph are distinct."""
+    return ''.join(rng.choice('bcdfghjklmnpqrstvwxz') + rng.choice('aeiou') for _ in range(rng.randint(2, 4)))
+
+
+def make_paragraph(word_count, rng):
+    """One line of prose with roughly 5% misspellings, a few wikilinks, tags and footnotes."""
+    words = []
+    for i in range(word_count):
+        roll = rng.random()
+        if roll < 0.05:
+            words.append(make_typo(rng))
+        elif roll < 0.06:
+            words.append(f"[[{make_typo(rng)}]]")
+        elif roll < 0.07:
+            words.append(f"@{make_typo(rng)}")
+        elif roll < 0.075:
+            words.append(f"[^{i}]")
+        elif roll < 0.09:
+            words.append(f"**{rng.choice(WORDS)}**")
+        else:
+            words.append(rng.choice(WORDS))
+    return ' '.join(words)
+
+
+def main():
+    app = QApplication(sys.argv)
+    rng = random.Random(42)
+    print(f"{'words':>8} {'best ms':>10} {'underlines':>11}")
+    for size in SIZES:
+        text = make_paragraph(size, rng)
+        document = QTextDocument()
+        document.setPlainText(text)
+        highlighter = MarkdownHighlighter(document, THEME, FakeApp())
+        highlighter.spell_cache.unknown(set(WORD_PATTERN.findall(text)))
+
+        best = None
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            highlighter.rehighlight()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        underlines = sum(1 for fmt in document.firstBlock().layout().formats()
+                         if fmt.format == highlighter.misspelled_format)
+        print(f"{size:>8} {best * 1000:>10.1f} {underlines:>11}")
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
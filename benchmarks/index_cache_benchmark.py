@@ -0,0 +1,85 @@
+"""
+Times the search index cache on a synthetic project: a cold sync that parses
+every document, saving the cache, a warm sync with nothing changed, and a
+warm sync after one document was edited.
+
+Run from the repository root:
+    python benchmarks/index_cache_benchmark.py [document count]
+
+The project is written to a temporary directory and removed afterwards.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tabula_writer.utils.search_indexer import SearchIndexer, CACHE_FILENAME
+
+DOCUMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+WORDS_PER_DOCUMENT = 1500
+WORDS_PER_LINE = 12
+VOCABULARY = 60000
+
+
+def build_project(root, count):
+    """Writes `count` documents of Zipf-distributed random words."""
+    rng = random.Random(1)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = [''.join(rng.choices(letters, k=rng.randint(3, 10))) for _ in range(VOCABULARY)]
+    weights = [1 / rank for rank in range(1, VOCABULARY + 1)]
+    paths = []
+    for i in range(count):
+        words = rng.choices(vocabulary, weights=weights, k=WORDS_PER_DOCUMENT)
+        lines = [' '.join(words[j:j + WORDS_PER_LINE]) for j in range(0, WORDS_PER_DOCUMENT, WORDS_PER_LINE)]
+        path = os.path.join(root, f"scene-{i:05d}.md")
+        with open(path, 'w') as f:
+            f.write(f"# Scene {i} [[Place {i % 40}]] @pov{i % 7}\n" + '\n'.join(lines))
+        paths.append(path)
+    return paths
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="tabula-index-")
+    try:
+        print(f"Writing {DOCUMENTS} documents...")
+        files_info = [{'path': path} for path in build_project(root, DOCUMENTS)]
+        cache_path = os.path.join(root, CACHE_FILENAME)
+
+        cold_ms, cold = timed(lambda: SearchIndexer(cache_path).sync_index(files_info))
+        assert cold == DOCUMENTS
+
+        indexer = SearchIndexer(cache_path)
+        indexer.load_cache()
+        indexer._dirty = True
+        save_ms, _ = timed(indexer.save_cache)
+
+        warm_ms, warm = timed(lambda: SearchIndexer(cache_path).sync_index(files_info))
+        assert warm == 0
+
+        with open(files_info[0]['path'], 'a') as f:
+            f.write("\nan edited line")
+        edited_ms, edited = timed(lambda: SearchIndexer(cache_path).sync_index(files_info))
+        assert edited == 1
+
+        print(f"{'index':<32}{'ms':>10}")
+        print(f"{'cold sync (parse all)':<32}{cold_ms:>10.1f}")
+        print(f"{'save cache':<32}{save_ms:>10.1f}")
+        print(f"{'warm sync, nothing changed':<32}{warm_ms:>10.1f}")
+        print(f"{'warm sync, one file edited':<32}{edited_ms:>10.1f}")
+        print(f"cache file: {os.path.getsize(cache_path) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
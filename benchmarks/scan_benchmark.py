@@ -0,0 +1,109 @@
+"""
+Times rescans of a synthetic 50k-document project: the old os.walk scan
+against DirectoryScanner's first scan, an unchanged rescan, a rescan after
+one file was added, and a full rescan that re-stats every document.
+
+Run from the repository root:
+    python benchmarks/scan_benchmark.py [document count]
+
+The project is written to a temporary directory and removed afterwards.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tabula_writer.utils.directory_scanner import DirectoryScanner, RACY_SECONDS
+
+DOCUMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+PER_DIRECTORY = 50
+DIRECTORIES_PER_PARENT = 20
+REPEATS = 3
+
+
+def build_project(root, count):
+    """Writes `count` small documents, PER_DIRECTORY to a folder, in a two-level tree."""
+    for i in range(count):
+        folder = i // PER_DIRECTORY
+        directory = os.path.join(root, f"part-{folder // DIRECTORIES_PER_PARENT:03d}", f"chapter-{folder:04d}")
+        if i % PER_DIRECTORY == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"scene-{i:05d}.md"), 'w') as f:
+            f.write(f"# Scene {i}\n")
+    # Backdate everything so no directory counts as recently modified
+    past = time.time() - 10 * RACY_SECONDS
+    for current, _, _ in os.walk(root):
+        os.utime(current, (past, past))
+
+
+def walk_scan(root):
+    """What ChapterPanel.scan_filesystem did before the scanner."""
+    signatures = {}
+    for current, _, files in os.walk(root):
+        for file in files:
+            if file.endswith(".md"):
+                path = os.path.join(current, file)
+                stat = os.stat(path)
+                signatures[path] = (stat.st_mtime, stat.st_size)
+    return signatures
+
+
+def best_of(fn, prepare=None):
+    timings = []
+    for _ in range(REPEATS):
+        if prepare:
+            prepare()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="tabula-scan-")
+    try:
+        print(f"Writing {DOCUMENTS} documents...")
+        build_project(root, DOCUMENTS)
+
+        walk_ms, walked = best_of(lambda: walk_scan(root))
+
+        first_ms, _ = best_of(lambda: DirectoryScanner(root).scan())
+        scanner = DirectoryScanner(root)
+        first = scanner.scan()
+        assert first['documents'] == walked
+
+        unchanged_ms, unchanged = best_of(scanner.scan)
+        assert not unchanged['changed_directories']
+
+        target = os.path.join(root, "part-000", "chapter-0000")
+        counter = iter(range(REPEATS))
+
+        def add_document():
+            n = next(counter)
+            with open(os.path.join(target, f"new-{n}.md"), 'w') as f:
+                f.write("# New\n")
+            # A distinct mtime in the past: changed, yet old enough for its listing to be cached
+            past = time.time() - 10 * RACY_SECONDS + n
+            os.utime(target, (past, past))
+
+        added_ms, added = best_of(scanner.scan, prepare=add_document)
+        assert len(added['added']) == 1 and added['changed_directories'] == [target]
+
+        full_ms, _ = best_of(lambda: scanner.scan(full=True))
+
+        print(f"{'scan':<32}{'ms':>10}")
+        print(f"{'os.walk + stat':<32}{walk_ms:>10.1f}")
+        print(f"{'scanner, first scan':<32}{first_ms:>10.1f}")
+        print(f"{'scanner, nothing changed':<32}{unchanged_ms:>10.1f}")
+        print(f"{'scanner, one file added':<32}{added_ms:>10.1f}")
+        print(f"{'scanner, full (re-stat all)':<32}{full_ms:>10.1f}")
+        print(f"{len(first['directories'])} directories, {len(first['documents'])} documents")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
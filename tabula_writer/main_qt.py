@@ -1,7 +1,6 @@
 import sys
 import os
-import re
-import datetime
+import time
 import tempfile
 import subprocess
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QSplitter, QVBoxLayout,
@@ -9,12 +8,12 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QSplitter, QVBo
 from PyQt6.QtGui import QShortcut, QKeySequence, QAction, QPixmap
 from PyQt6.QtCore import Qt, QTimer, QThreadPool, QMetaObject, Q_ARG, QEvent, QObject, pyqtProperty, QPropertyAnimation, QEasingCurve, QCoreApplication
 
-from .utils.project_loader import load_project
+from .utils.project_model_qt import ProjectModel
 from .utils.email_sender import send_email
 from .utils.config_manager import load_config, save_config
 from .utils.exporter import export_to_docx, export_to_pdf
 from .utils.worker_qt import Worker
-from .utils.search_indexer import SearchIndexer
+from .utils.search_indexer import SearchIndexer, CACHE_FILENAME
 from .utils.pomodoro_timer_qt import PomodoroTimer
 from .panels_qt.chapter_panel_qt import ChapterPanel
 from .panels_qt.editor_panel_qt import EditorPanel
@@ -32,6 +31,10 @@ from .popups_qt.wifi_popup_qt import WifiPopup
 from .popups_qt.bluetooth_popup_qt import BluetoothPopup
 from .popups_qt.file_dialog_popup_qt import FileDialogPopup
 
+# A full re-stat of the project runs at most this often when the window is activated,
+# catching documents edited in place by other programs while Tabula was in the background
+RECONCILE_INTERVAL_SECONDS = 30
+
 class FocusTracker(QObject):
     def __init__(self, main_window):
         super().__init__(main_window)
@@ -85,12 +88,14 @@ class WriterDeckApp(QMainWindow):
             self.config["project_path"] = self.project_path
             save_config(self.config)
 
-        self.directories, self.documents, self.notes_path = load_project(self.project_path)
-        self.documents_path = os.path.join(self.project_path, "documents")
+        # Populated by the startup scan, then kept current from file system events
+        self.project = ProjectModel(self.project_path, self)
+        self.documents_path = self.project.documents_path
 
         self.threadpool = QThreadPool()
-        self.search_indexer = SearchIndexer()
+        self.search_indexer = SearchIndexer(cache_path=os.path.join(self.project.notes_path, CACHE_FILENAME))
         self.current_search_worker = None
+        self.last_reconcile = time.monotonic()
         self.pomodoro_timer = PomodoroTimer()
         
         self.is_searching = False
@@ -115,6 +120,16 @@ class WriterDeckApp(QMainWindow):
         self.focus_tracker = FocusTracker(self)
         QApplication.instance().installEventFilter(self.focus_tracker)
 
+    def changeEvent(self, event):
+        if event.type() == QEvent.Type.ActivationChange and self.isActiveWindow():
+            self.reconcile_project()
+        super().changeEvent(event)
+
+    def closeEvent(self, event):
+        # Saved on the pool so the window closes at once; main() waits for the pool before exiting
+        self.threadpool.start(Worker(self.search_indexer.save_cache))
+        super().closeEvent(event)
+
     def mousePressEvent(self, event):
         if self.status_bar.geometry().contains(event.pos()):
             self.drag_pos = event.globalPosition().toPoint() - self.frameGeometry().topLeft()
@@ -216,42 +231,63 @@ class WriterDeckApp(QMainWindow):
             panel.tag_clicked.connect(self.on_tag_click)
         
         self.editor_panel.file_saved.connect(self.update_search_index)
-        self.editor_panel.file_saved.connect(self.run_rescan)
-        self.editor_panel.headers_updated.connect(self.document_panel.update_headers_for_current_doc)
+        self.editor_panel.file_saved.connect(self.project.note_saved)
+        self.editor_panel.outline_changed.connect(self.document_panel.apply_outline_changes)
         
         self.notes_panel.file_saved.connect(self.update_search_index)
         self.pomodoro_timer.time_updated.connect(self.update_pomodoro_display)
         self.pomodoro_timer.emit_update()
+        self.project.documents_changed.connect(self.on_documents_changed)
 
-    def run_rescan(self):
+    def run_rescan(self, full=False):
         self.status_bar.showMessage("Refreshing document list...")
-        worker = Worker(self.document_panel.scan_filesystem)
-        worker.signals.result.connect(self.on_rescan_finished)
+        worker = Worker(self.project.scan, full=full)
+        worker.signals.result.connect(self.project.apply_scan)
         worker.signals.error.connect(lambda err: QMessageBox.critical(self, "Error Scanning Files", str(err[1])))
         self.threadpool.start(worker)
 
-    def on_rescan_finished(self, result):
-        self.directories, self.documents = result
-        self.document_panel.populate_tree(self.directories, self.documents)
-        
-        if self.editor_panel.current_path and self.editor_panel.current_path not in self.documents:
+    def reconcile_project(self):
+        if not self.project.populated or time.monotonic() - self.last_reconcile < RECONCILE_INTERVAL_SECONDS:
+            return
+        self.last_reconcile = time.monotonic()
+        worker = Worker(self.project.scan, full=True)
+        worker.signals.result.connect(self.project.apply_scan)
+        self.threadpool.start(worker)
+
+    def on_documents_changed(self, changes):
+        if self.editor_panel.current_path and not self.project.contains(self.editor_panel.current_path):
             self.editor_panel.load_file(None)
 
-        self.status_bar.showMessage("Rebuilding search index...", 3000)
-        index_worker = Worker(self.search_indexer.build_index, self._get_all_project_files())
-        index_worker.signals.finished.connect(lambda: self.status_bar.showMessage("Ready", 2000))
-        self.threadpool.start(index_worker)
+        if changes is None:
+            # First scan of the session: validate the saved index against the whole project
+            self.status_bar.showMessage("Updating search index...", 3000)
+            index_worker = Worker(self.search_indexer.sync_index, self.project.files_info())
+            index_worker.signals.finished.connect(lambda: self.status_bar.showMessage("Ready", 2000))
+            self.threadpool.start(index_worker)
+        elif any(changes.values()):
+            self.threadpool.start(Worker(self.search_indexer.apply_changes,
+                                         changes['added'] + changes['modified'], changes['removed']))
+        else:
+            self.status_bar.showMessage("Ready", 2000)
 
         if not self.editor_panel.current_path:
-            if self.documents:
-                self.load_document(self.documents[0])
+            if self.project.documents:
+                self.load_document(self.project.documents[0])
+
+    def reindex_project(self):
+        self.status_bar.showMessage("Rebuilding search index...")
+        worker = Worker(self.search_indexer.rebuild_index, self.project.files_info())
+        worker.signals.finished.connect(lambda: self.status_bar.showMessage("Search index rebuilt.", 3000))
+        self.threadpool.start(worker)
 
     def update_search_index(self, path, content):
         self.threadpool.start(Worker(self.search_indexer.update_file, path, content))
 
     def apply_stylesheet(self):
         self.editor_panel.text_edit.set_font_size(self.base_font_size)
-        self.editor_panel.highlighter.rehighlight()
+        # Rebuilds the highlighters' cached formats, header formats included, from the current theme
+        for panel in (self.editor_panel, self.notes_panel.general_notes_view):
+            panel.highlighter.set_theme(self.theme)
 
         qss = f"""
             QMainWindow, QWidget {{
@@ -333,15 +369,23 @@ class WriterDeckApp(QMainWindow):
 
     def update_word_count(self):
         active_panel_name = self.get_focused_panel_name()
-        content, current_file = "", "No File"
+        panel, current_file = None, "No File"
         if active_panel_name == "editor":
-            content = self.editor_panel.get_content()
+            panel = self.editor_panel
             if self.editor_panel.current_path: current_file = os.path.basename(self.editor_panel.current_path)
         elif active_panel_name == "notes":
-            content = self.notes_panel.get_content()
+            if self.notes_panel.stacked_widget.currentWidget() == self.notes_panel.general_notes_view:
+                panel = self.notes_panel.general_notes_view
             current_file = "_GeneralNotes.md"
-        word_count = len(content.split())
-        self.words_label.setText(f"{word_count:,} words")
+
+        # The panels keep their counts up to date as blocks change, so nothing is recounted here
+        text = "0 words"
+        if panel:
+            word_count, selected = panel.word_count, panel.selected_word_count()
+            text = f"{selected:,} of {word_count:,} words" if selected else f"{word_count:,} words"
+            if panel.session_word_delta:
+                text += f" ({panel.session_word_delta:+,} this session)"
+        self.words_label.setText(text)
         self.file_label.setText(current_file)
 
     def update_save_status(self):
@@ -372,6 +416,7 @@ class WriterDeckApp(QMainWindow):
             "Increase Font Size": ("Ctrl+Shift++", self.increase_font_size),
             "Decrease Font Size": ("Ctrl+Shift+-", self.decrease_font_size),
             "Update Program": ("Ctrl+Shift+U", self.run_updater),
+            "Reindex Project": ("Ctrl+Shift+R", self.reindex_project),
             # --- UPDATED PANEL NAVIGATION SHORTCUTS ---
             "Navigate Panel Left": ("Ctrl+Shift+Left", self.navigate_panels_left),
             "Navigate Panel Right": ("Ctrl+Shift+Right", self.navigate_panels_right),
@@ -414,13 +459,17 @@ class WriterDeckApp(QMainWindow):
         if self.font_animation and self.font_animation.state() == QPropertyAnimation.State.Running:
             return
 
-        current_size = self.editor_panel.text_edit.get_font_size()
+        text_edit = self.editor_panel.text_edit
+        current_size = text_edit.get_font_size()
         
-        self.font_animation = QPropertyAnimation(self.editor_panel.text_edit, b"dynamicFontSize")
+        self.font_animation = QPropertyAnimation(text_edit, b"dynamicFontSize")
         self.font_animation.setDuration(150)
         self.font_animation.setStartValue(current_size)
         self.font_animation.setEndValue(new_size)
         self.font_animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
+        # Intermediate sizes only restyle the editor; headers are rehighlighted once at the end
+        text_edit.begin_font_animation()
+        self.font_animation.finished.connect(text_edit.end_font_animation)
         self.font_animation.start()
         
         self.base_font_size = new_size # Update base_font_size to reflect current animated size
@@ -474,6 +523,7 @@ class WriterDeckApp(QMainWindow):
 
         if path and os.path.exists(path):
             headers = self.editor_panel.load_file(path)
+            self.project.watch_document(path)
             self.document_panel.update_headers_for_current_doc(headers)
             self.notes_panel.load_comments_for_document(path)
             self.document_panel.select_document_by_path(path)
@@ -489,24 +539,11 @@ class WriterDeckApp(QMainWindow):
 
     def _save_comment_from_popup(self, footnote_number, comment_text):
         if not self.editor_panel.current_path: return
-        doc_base = os.path.splitext(os.path.basename(self.editor_panel.current_path))[0]
-        sanitized_doc = re.sub(r'[^\w\-_\.]', '_', doc_base)
-        comments_dir = os.path.join(self.notes_path, 'comments', sanitized_doc)
-        os.makedirs(comments_dir, exist_ok=True)
-        comment_path = os.path.join(comments_dir, f"{sanitized_doc}_comment_{footnote_number}.md")
-        content = f"# Comment for [^{footnote_number}]\nReferencing: '{os.path.basename(self.editor_panel.current_path)}'\nDate: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n{comment_text.strip()}\n"
-        with open(comment_path, "w", encoding="utf-8") as f: f.write(content)
-        self.notes_panel.load_comments_for_document(self.editor_panel.current_path)
+        self.project.save_comment(self.editor_panel.current_path, footnote_number, comment_text)
 
     def delete_comments_for_footnotes(self, footnote_numbers, doc_path):
         if not doc_path: return
-        doc_base = os.path.splitext(os.path.basename(doc_path))[0]
-        sanitized_doc = re.sub(r'[^\w\-_\.]', '_', doc_base)
-        comments_dir = os.path.join(self.notes_path, 'comments', sanitized_doc)
-        for num in footnote_numbers:
-            path = os.path.join(comments_dir, f"{sanitized_doc}_comment_{num}.md")
-            if os.path.exists(path): os.remove(path)
-        self.notes_panel.load_comments_for_document(doc_path)
+        self.project.delete_comments(doc_path, footnote_numbers)
 
     def get_focused_panel_name(self):
         focused_widget = QApplication.focusWidget()
@@ -522,19 +559,12 @@ class WriterDeckApp(QMainWindow):
         elif hasattr(panel, 'focus_list'):
             panel.focus_list()
 
-    def _get_all_project_files(self):
-        files_info = [{'path': p, 'type': 'document', 'name': os.path.splitext(os.path.basename(p))[0]} for p in self.documents]
-        notes_main = os.path.join(self.notes_path, "_GeneralNotes.md")
-        if os.path.exists(notes_main):
-            files_info.append({'path': notes_main, 'type': 'note', 'name': '_GeneralNotes'})
-        return files_info
-
     def on_wikilink_click(self, link):
         paths = self.search_indexer.get_occurrences_for_wikilink(link)
         if not paths:
             QMessageBox.information(self, "Not Found", f"No occurrences of '[[{link}]]' were found in the project.")
             return
-        matches = [f for f in self._get_all_project_files() if f['path'] in paths]
+        matches = [f for f in self.project.files_info() if f['path'] in paths]
         if not matches:
             QMessageBox.information(self, "Not Found", f"No occurrences of '[[{link}]]' were found in the project.")
             return
@@ -549,7 +579,7 @@ class WriterDeckApp(QMainWindow):
 
     def on_tag_click(self, tag):
         paths = self.search_indexer.get_files_for_tag(tag)
-        matches = [f for f in self._get_all_project_files() if f['path'] in paths]
+        matches = [f for f in self.project.files_info() if f['path'] in paths]
         if matches: TagPopup(tag[1:], matches, self.load_document, self).show_animated()
 
     def _get_footnotes_for_export(self):
@@ -590,7 +620,7 @@ class WriterDeckApp(QMainWindow):
     def show_search_popup(self):
         if self.is_searching: return
         self.is_searching = True
-        dialog = SearchPopup(self.search_indexer, self._get_all_project_files(), self.load_document, self)
+        dialog = SearchPopup(self.search_indexer, self.project.files_info(), self.load_document, self)
         dialog.finished.connect(lambda: self.on_search_popup_closed())
         dialog.show_animated()
 
@@ -631,7 +661,9 @@ def main(): # Wrapped the startup code in a function
     main_win.show()
     main_win.showFullScreen()
     splash.finish(main_win)
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    main_win.threadpool.waitForDone()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main() # Call the main function
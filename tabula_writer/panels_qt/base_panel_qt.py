@@ -2,6 +2,10 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QFrame, QLabel
 from PyQt6.QtCore import pyqtSignal
 from .panel_components import InteractiveTextEdit, MarkdownHighlighter
+from ..utils.block_tracker_qt import BlockTracker
+
+def count_words(text):
+    return len(text.split())
 
 class BasePanel(QWidget):
     word_count_changed = pyqtSignal()
@@ -39,12 +43,21 @@ class BasePanel(QWidget):
         self.highlighter = MarkdownHighlighter(self.text_edit.document(), self.app.theme, self.app)
         content_layout.addWidget(self.text_edit)
 
+        # Word counts are kept per block, so the total is updated from edited blocks only
+        self.word_tracker = BlockTracker(self.text_edit.document(), count_words, self)
+        self.word_count = sum(self.word_tracker.values)
+        self.session_start_words = self.word_count
+        self.word_tracker.blocks_changed.connect(self._on_word_blocks_changed)
+
         self.text_edit.textChanged.connect(self.on_text_changed)
+        self.text_edit.selectionChanged.connect(self.word_count_changed)
         self.text_edit.wikilink_clicked.connect(self.wikilink_clicked)
         self.text_edit.footnote_clicked.connect(self.footnote_clicked)
         self.text_edit.tag_clicked.connect(self.tag_clicked)
 
     def on_text_changed(self):
+        if self.highlighter.repainting:
+            return
         self.text_modified = True
         self.word_count_changed.emit()
         self.save_status_changed.emit()
@@ -52,6 +65,21 @@ class BasePanel(QWidget):
     def get_content(self):
         return self.text_edit.toPlainText()
 
+    def _on_word_blocks_changed(self, first, old_counts, new_counts):
+        self.word_count += sum(new_counts) - sum(old_counts)
+
+    def selected_word_count(self):
+        cursor = self.text_edit.textCursor()
+        return count_words(cursor.selectedText()) if cursor.hasSelection() else 0
+
+    def start_word_session(self):
+        """Makes the current word count the baseline for session_word_delta, e.g. after loading a file."""
+        self.session_start_words = self.word_count
+
+    @property
+    def session_word_delta(self):
+        return self.word_count - self.session_start_words
+
     def focus_text(self):
         self.text_edit.setFocus()
     
@@ -1,14 +1,17 @@
 # tabula_writer/panels_qt/chapter_panel_qt.py
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QTreeWidget, QTreeWidgetItem,
-                             QTreeWidgetItemIterator, QMessageBox, QInputDialog,
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QTreeView, QMessageBox, QInputDialog,
                              QLabel, QMenu, QDialog, QFrame, QStyledItemDelegate, QStyle)
-from PyQt6.QtCore import pyqtSignal, Qt, QTimer, QSize
+from PyQt6.QtCore import pyqtSignal, Qt, QTimer, QSize, QModelIndex
 from PyQt6.QtGui import QFont, QAction, QIcon, QPainter, QColor, QBrush, QPen
 import os
 import re
 import shutil
 from tabula_writer.utils.nav_qt import handle_panel_navigation
 from tabula_writer.popups_qt.input_popup_qt import InputPopup
+from tabula_writer.panels_qt.document_tree_model_qt import DocumentTreeModel, KIND_ROLE, PATH_ROLE, DEPTH_ROLE
+
+# Above this many documents, folders start collapsed and their rows are only created when opened
+AUTO_EXPAND_DOCUMENTS = 2000
 
 class CustomItemDelegate(QStyledItemDelegate):
     def __init__(self, parent, theme):
@@ -26,13 +29,7 @@ class CustomItemDelegate(QStyledItemDelegate):
 
         rect = option.rect
         
-        depth = 0
-        parent = index.parent()
-        while parent.isValid():
-            depth += 1
-            parent = parent.parent()
-        
-        indentation = depth * 20
+        indentation = (index.data(DEPTH_ROLE) or 0) * 20
 
         painter.fillRect(rect, QColor("#B2A68D"))
 
@@ -74,11 +71,11 @@ class CustomItemDelegate(QStyledItemDelegate):
 
         painter.restore()
 
-class DocumentTreeWidget(QTreeWidget):
+class DocumentTreeView(QTreeView):
     def __init__(self, parent_panel):
         super().__init__()
         self.parent_panel = parent_panel
-        self.setObjectName("DocumentTreeWidget")
+        self.setObjectName("DocumentTreeView")
 
     def keyPressEvent(self, event):
         if handle_panel_navigation(self.parent_panel, event):
@@ -88,20 +85,20 @@ class DocumentTreeWidget(QTreeWidget):
         key = event.key()
         modifiers = event.modifiers()
         
-        current_item = self.currentItem()
-        if not current_item and key not in (Qt.Key.Key_Up, Qt.Key.Key_Down):
+        current_index = self.currentIndex()
+        if not current_index.isValid() and key not in (Qt.Key.Key_Up, Qt.Key.Key_Down):
             if modifiers == (Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier) and key == Qt.Key.Key_N:
                 self.parent_panel.create_new_folder()
                 event.accept()
                 return
         
-        if not current_item:
+        if not current_index.isValid():
             super().keyPressEvent(event)
             return
 
         if key == Qt.Key.Key_R:
-            if current_item.childCount() > 0:
-                current_item.setExpanded(not current_item.isExpanded())
+            if self.model().hasChildren(current_index):
+                self.setExpanded(current_index, not self.isExpanded(current_index))
             event.accept()
             return
         
@@ -111,21 +108,21 @@ class DocumentTreeWidget(QTreeWidget):
             return
 
         if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
-            if current_item.data(0, Qt.ItemDataRole.UserRole) == "file":
-                self.parent_panel.on_item_selected(current_item)
-            elif current_item.data(0, Qt.ItemDataRole.UserRole) == "header":
-                self.parent_panel.on_header_selected(current_item)
+            if current_index.data(KIND_ROLE) == "file":
+                self.parent_panel.on_item_selected(current_index)
+            elif current_index.data(KIND_ROLE) == "header":
+                self.parent_panel.on_header_selected(current_index)
             event.accept()
             return
         
         super().keyPressEvent(event)
     
     def contextMenuEvent(self, event):
-        item = self.itemAt(event.pos())
+        index = self.indexAt(event.pos())
         
         menu = QMenu(self)
         
-        if item: 
+        if index.isValid(): 
             rename_action = QAction("Rename", self)
             rename_action.triggered.connect(self.parent_panel.rename_selected_item)
             menu.addAction(rename_action)
@@ -145,7 +142,7 @@ class DocumentTreeWidget(QTreeWidget):
         
         menu.addSeparator()
         refresh_action = QAction("Refresh", self)
-        refresh_action.triggered.connect(self.parent_panel.app.run_rescan)
+        refresh_action.triggered.connect(lambda: self.parent_panel.app.run_rescan(full=True))
         menu.addAction(refresh_action)
 
         menu.exec(event.globalPos())
@@ -159,6 +156,8 @@ class ChapterPanel(QWidget):
         self.app = app_instance
         self.folder_icon = QIcon("assets/folder.svg")
         self.note_icon = QIcon("assets/note.svg")
+        self.header_font = QFont("Georgia", 12)
+        self.header_font.setItalic(True)
 
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(0, 0, 0, 0)
@@ -175,134 +174,98 @@ class ChapterPanel(QWidget):
         header_label.setObjectName("PanelHeader")
         content_layout.addWidget(header_label)
 
-        self.tree_widget = DocumentTreeWidget(self)
-        self.tree_widget.setHeaderHidden(True)
-        self.tree_widget.setIndentation(0)
-        self.tree_widget.setRootIsDecorated(False)
+        self.tree_model = DocumentTreeModel(self.app.documents_path, self.folder_icon, self.note_icon, self.header_font, self)
+        self.tree_view = DocumentTreeView(self)
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.setHeaderHidden(True)
+        self.tree_view.setIndentation(0)
+        self.tree_view.setRootIsDecorated(False)
+        self.tree_view.setUniformRowHeights(True)
         
-        self.tree_widget.setItemDelegate(CustomItemDelegate(self.tree_widget, self.app.theme))
-        self.tree_widget.setStyleSheet("background-color: transparent; border: none;")
+        self.tree_view.setItemDelegate(CustomItemDelegate(self.tree_view, self.app.theme))
+        self.tree_view.setStyleSheet("background-color: transparent; border: none;")
 
-        self.tree_widget.itemDoubleClicked.connect(self.handle_item_double_click)
-        content_layout.addWidget(self.tree_widget)
+        self.tree_view.doubleClicked.connect(self.handle_item_double_click)
+        self.tree_model.rowsInserted.connect(self.on_rows_inserted)
+        content_layout.addWidget(self.tree_view)
 
-        self.tree_widget.addTopLevelItem(QTreeWidgetItem(["Loading..."]))
+        self.auto_expand = True
+        self.app.project.listing_changed.connect(self.on_listing_changed)
+
+    def on_listing_changed(self):
+        self.populate_tree(self.app.project.directories, self.app.project.documents)
 
     def populate_tree(self, directories, files):
-        self.tree_widget.clear()
-        docs_path = self.app.documents_path
-        
-        path_map = {docs_path: self.tree_widget.invisibleRootItem()}
-
-        for dir_path in sorted(directories):
-            if dir_path == docs_path: continue
-            parent_path, dir_name = os.path.split(dir_path)
-            parent_item = path_map.get(parent_path)
-            if parent_item:
-                dir_item = QTreeWidgetItem(parent_item, [dir_name])
-                dir_item.setIcon(0, self.folder_icon)
-                dir_item.setData(0, Qt.ItemDataRole.UserRole, "folder")
-                dir_item.setData(1, Qt.ItemDataRole.UserRole, dir_path)
-                path_map[dir_path] = dir_item
-        
-        for file_path in files:
-            parent_path, file_name = os.path.split(file_path)
-            parent_item = path_map.get(parent_path)
-            if parent_item:
-                file_item = QTreeWidgetItem(parent_item, [os.path.splitext(file_name)[0]])
-                file_item.setIcon(0, self.note_icon)
-                file_item.setData(0, Qt.ItemDataRole.UserRole, "file")
-                file_item.setData(1, Qt.ItemDataRole.UserRole, file_path)
-
-        self.tree_widget.expandAll()
+        """
+        Hands the folders and documents to the tree model, which updates the
+        rows it has already created in place, keyed by path, so the selection,
+        expanded folders and header rows stay as they were.
+        """
+        self.auto_expand = len(files) <= AUTO_EXPAND_DOCUMENTS
+        self.tree_model.set_project(directories, files)
+        if self.tree_model.canFetchMore(QModelIndex()):
+            self.tree_model.fetchMore(QModelIndex())
+
+    def on_rows_inserted(self, parent, first, last):
+        # Folders open as they appear, as long as the project is small enough to show whole
+        if not self.auto_expand:
+            return
+        for row in range(first, last + 1):
+            index = self.tree_model.index(row, 0, parent)
+            if index.data(KIND_ROLE) == "folder":
+                self.tree_view.expand(index)
     
-    def scan_filesystem(self):
-        docs_path = self.app.documents_path
-        directories = [docs_path]
-        documents = []
-        for root, dirs, files in os.walk(docs_path):
-            for name in dirs:
-                directories.append(os.path.join(root, name))
-            for file in files:
-                if file.endswith(".md"):
-                    documents.append(os.path.join(root, file))
-        documents.sort()
-        return directories, documents
-
-    def handle_item_double_click(self, item, column):
-        item_type = item.data(0, Qt.ItemDataRole.UserRole)
+    def handle_item_double_click(self, index):
+        item_type = index.data(KIND_ROLE)
         if item_type == "file":
-            self.on_item_selected(item)
+            self.on_item_selected(index)
         elif item_type == "header":
-            self.on_header_selected(item)
+            self.on_header_selected(index)
         elif item_type == "folder":
-            item.setExpanded(not item.isExpanded())
+            self.tree_view.setExpanded(index, not self.tree_view.isExpanded(index))
 
-    def on_item_selected(self, item):
-        file_path = item.data(1, Qt.ItemDataRole.UserRole)
+    def on_item_selected(self, index):
+        file_path = index.data(PATH_ROLE)
         self.document_selected.emit(file_path)
         
-    def on_header_selected(self, item):
-        header_text = item.data(0, Qt.ItemDataRole.WhatsThisRole)
+    def on_header_selected(self, index):
+        header_text = index.data(Qt.ItemDataRole.WhatsThisRole)
         self.app.editor_panel.text_edit.find(header_text)
         self.app.editor_panel.text_edit.setFocus()
 
-    def find_item_by_path(self, path):
-        iterator = QTreeWidgetItemIterator(self.tree_widget)
-        while iterator.value():
-            item = iterator.value()
-            if item.data(1, Qt.ItemDataRole.UserRole) == path:
-                return item
-            iterator += 1
-        return None
-
     def select_document_by_path(self, path):
-        item = self.find_item_by_path(path)
-        if item:
-            self.tree_widget.setCurrentItem(item)
-            self.tree_widget.scrollToItem(item, QTreeWidget.ScrollHint.PositionAtTop)
+        index = self.tree_model.index_for_path(path)
+        if index.isValid():
+            self.tree_view.setCurrentIndex(index)
+            self.tree_view.scrollTo(index, QTreeView.ScrollHint.PositionAtTop)
 
     def update_headers_for_current_doc(self, headers):
-        iterator = QTreeWidgetItemIterator(self.tree_widget, QTreeWidgetItemIterator.IteratorFlag.All)
-        items_to_remove = []
-        while iterator.value():
-            item = iterator.value()
-            parent = item.parent()
-            if parent and item.data(0, Qt.ItemDataRole.UserRole) == "header":
-                items_to_remove.append((parent, parent.indexOfChild(item)))
-            iterator += 1
-        
-        for parent, index in reversed(items_to_remove):
-            parent.takeChild(index)
-
         current_doc_path = self.app.editor_panel.current_path
-        if not current_doc_path: return
-        
-        target_item = self.find_item_by_path(current_doc_path)
-        if not target_item: return
-
-        header_font = QFont("Georgia", 12)
-        header_font.setItalic(True)
-        for level, title in headers:
-            item_text = "› " + title.strip()
-            
-            header_item = QTreeWidgetItem(target_item, [item_text])
-            header_item.setFont(0, header_font)
-            header_item.setData(0, Qt.ItemDataRole.UserRole, "header")
-            header_item.setData(0, Qt.ItemDataRole.WhatsThisRole, title.strip())
-
-        target_item.setExpanded(True)
+        self.tree_model.set_headers(current_doc_path, headers if current_doc_path else [])
+        if current_doc_path and headers:
+            index = self.tree_model.index_for_path(current_doc_path)
+            if index.isValid():
+                self.tree_view.expand(index)
+
+    def apply_outline_changes(self, changes):
+        """
+        Applies the inserted, removed and renamed headers reported by the editor
+        to the current document's header rows, leaving the rest of the tree alone.
+        Falls back to a full refresh if the rows are out of step with the editor.
+        """
+        if not self.tree_model.apply_outline_changes(changes, self.app.editor_panel.header_count):
+            self.update_headers_for_current_doc(self.app.editor_panel.headers)
 
     def focus_list(self):
-        QTimer.singleShot(0, self.tree_widget.setFocus)
+        QTimer.singleShot(0, self.tree_view.setFocus)
 
     def get_current_directory(self):
-        current_item = self.tree_widget.currentItem()
+        current_index = self.tree_view.currentIndex()
         parent_path = self.app.documents_path
         
-        if current_item:
-            item_type = current_item.data(0, Qt.ItemDataRole.UserRole)
-            item_path = current_item.data(1, Qt.ItemDataRole.UserRole)
+        if current_index.isValid():
+            item_type = current_index.data(KIND_ROLE)
+            item_path = current_index.data(PATH_ROLE)
             if item_type == "folder":
                 parent_path = item_path
             elif item_type == "file":
@@ -328,7 +291,7 @@ class ChapterPanel(QWidget):
                     return
                 try:
                     os.makedirs(new_folder_path)
-                    self.app.run_rescan()
+                    self.app.project.refresh(parent_path)
                 except Exception as e:
                     QMessageBox.critical(self, "Error", f"Failed to create folder:\n{new_folder_path}\n\nError: {e}")
     
@@ -354,19 +317,19 @@ class ChapterPanel(QWidget):
                     with open(filename, "w", encoding="utf-8") as f: 
                         f.write(content)
                     
-                    self.app.run_rescan()
+                    self.app.project.refresh(parent_path)
                     QTimer.singleShot(250, lambda: self.app.load_document(filename))
 
                 except Exception as e:
                     QMessageBox.critical(self, "Error", f"Failed to create document:\n{filename}\n\nError: {e}")
 
     def delete_selected_item(self):
-        item = self.tree_widget.currentItem()
-        if not item: return
+        index = self.tree_view.currentIndex()
+        if not index.isValid(): return
 
-        item_type = item.data(0, Qt.ItemDataRole.UserRole)
-        item_path = item.data(1, Qt.ItemDataRole.UserRole)
-        item_name = item.text(0)
+        item_type = index.data(KIND_ROLE)
+        item_path = index.data(PATH_ROLE)
+        item_name = index.data(Qt.ItemDataRole.DisplayRole)
 
         reply = QMessageBox.question(self, "Confirm Delete", 
             f"Are you sure you want to permanently delete '{item_name}'?\n\nThis action cannot be undone.")
@@ -378,18 +341,18 @@ class ChapterPanel(QWidget):
                 elif item_type == "folder":
                     shutil.rmtree(item_path)
                 
-                self.app.run_rescan()
+                self.app.project.refresh(os.path.dirname(item_path))
 
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to delete {item_type}: {e}")
 
     def rename_selected_item(self):
-        item = self.tree_widget.currentItem()
-        if not item: return
+        index = self.tree_view.currentIndex()
+        if not index.isValid(): return
 
-        item_type = item.data(0, Qt.ItemDataRole.UserRole)
-        old_path = item.data(1, Qt.ItemDataRole.UserRole)
-        old_name_no_ext = os.path.splitext(item.text(0))[0]
+        item_type = index.data(KIND_ROLE)
+        old_path = index.data(PATH_ROLE)
+        old_name_no_ext = os.path.splitext(index.data(Qt.ItemDataRole.DisplayRole))[0]
 
         dialog = InputPopup(f"Rename {item_type.capitalize()}", "Enter new name:", old_name_no_ext, parent=self.app)
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -415,7 +378,7 @@ class ChapterPanel(QWidget):
                     
                     os.rename(old_path, new_path)
                     
-                    self.app.run_rescan()
+                    self.app.project.refresh(parent_path)
 
                     if is_renaming_current_file:
                         QTimer.singleShot(250, lambda: self.app.load_document(new_path))
@@ -0,0 +1,341 @@
+# tabula_writer/panels_qt/document_tree_model_qt.py
+import os
+from bisect import bisect_right
+from contextlib import contextmanager
+from PyQt6.QtCore import Qt, QAbstractItemModel, QModelIndex
+
+KIND_ROLE = Qt.ItemDataRole.UserRole
+PATH_ROLE = Qt.ItemDataRole.UserRole + 1
+DEPTH_ROLE = Qt.ItemDataRole.UserRole + 2
+
+# Rows created per fetchMore, so opening a folder of thousands of documents stays cheap
+FETCH_BATCH = 200
+
+
+def sort_key(kind, path):
+    """Folders before documents, each in path order."""
+    return (0 if kind == "folder" else 1, path)
+
+
+class TreeNode:
+    __slots__ = ('kind', 'path', 'title', 'parent', 'children', 'row', 'depth', 'fetched')
+
+    def __init__(self, kind, path, parent, row, title=None):
+        self.kind = kind
+        self.path = path
+        self.title = title
+        self.parent = parent
+        self.children = []
+        self.row = row
+        # Cached so painting a row never walks up the tree
+        self.depth = parent.depth + 1 if parent else -1
+        self.fetched = False
+
+
+class DocumentTreeModel(QAbstractItemModel):
+    """
+    The document panel's tree of folders, documents and the current
+    document's headers. set_project() only records which entries each folder
+    holds; nodes are created when the view asks for them through
+    canFetchMore/fetchMore, FETCH_BATCH rows at a time, so a project of tens
+    of thousands of documents costs no more to show than the rows on screen.
+
+    Each folder's nodes are always a prefix of its entries, and project
+    updates are applied as row insertions and removals keyed by path, so the
+    view keeps its selection and expanded folders.
+    """
+
+    def __init__(self, root_path, folder_icon, note_icon, header_font, parent=None):
+        super().__init__(parent)
+        self.folder_icon = folder_icon
+        self.note_icon = note_icon
+        self.header_font = header_font
+        self.root = TreeNode("folder", root_path, None, 0)
+        # folder path -> [(kind, path)] in display order
+        self.listing = {root_path: []}
+        # every folder and document node created so far, by path
+        self.nodes = {root_path: self.root}
+        # The current document and its headers; attached whenever its node exists
+        self.outline_path = None
+        self.outline = []
+        # Views may ask for more rows while being told about a change; they get them afterwards
+        self.changing = False
+
+    # --- Qt model interface ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if column != 0 or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, 0, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self._node(parent)
+        if node.kind == "folder":
+            return bool(node.children) or bool(self.listing.get(node.path))
+        return bool(node.children)
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return not self.changing and node.kind == "folder" and len(node.children) < len(self.listing.get(node.path, ()))
+
+    def fetchMore(self, parent):
+        if self.changing:
+            return
+        node = self._node(parent)
+        self._fetch_to(node, len(node.children) + FETCH_BATCH)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if node.kind == "header":
+                return "› " + node.title
+            name = os.path.basename(node.path)
+            return name if node.kind == "folder" else os.path.splitext(name)[0]
+        if role == Qt.ItemDataRole.DecorationRole:
+            if node.kind == "folder":
+                return self.folder_icon
+            if node.kind == "file":
+                return self.note_icon
+            return None
+        if role == Qt.ItemDataRole.FontRole and node.kind == "header":
+            return self.header_font
+        if role == Qt.ItemDataRole.WhatsThisRole and node.kind == "header":
+            return node.title
+        if role == KIND_ROLE:
+            return node.kind
+        if role == PATH_ROLE:
+            return node.path
+        if role == DEPTH_ROLE:
+            return node.depth
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    # --- Project contents ---
+
+    def set_project(self, directories, files):
+        """Records the folders and documents to show and updates the rows already created to match."""
+        root_path = self.root.path
+        listing = {root_path: []}
+        for dir_path in sorted(directories):
+            if dir_path == root_path: continue
+            parent_path = os.path.dirname(dir_path)
+            if parent_path in listing:
+                listing[parent_path].append(("folder", dir_path))
+                listing[dir_path] = []
+        for file_path in files:
+            parent_path = os.path.dirname(file_path)
+            if parent_path in listing:
+                listing[parent_path].append(("file", file_path))
+
+        old_listing, self.listing = self.listing, listing
+        with self._changing():
+            for path in sorted(p for p, node in self.nodes.items() if node.kind == "folder"):
+                node = self.nodes.get(path)
+                if node is not None and node.kind == "folder":
+                    self._reconcile(node, old_listing.get(path, ()))
+
+    def index_for_path(self, path):
+        """The index of a folder or document, creating the rows leading to it. Invalid if it is not in the project."""
+        node = self.nodes.get(path)
+        if node is None:
+            parent_path = os.path.dirname(path)
+            if parent_path == path or (parent_path not in self.nodes and not self.index_for_path(parent_path).isValid()):
+                return QModelIndex()
+            entries = self.listing.get(parent_path, ())
+            position = next((row for row, (kind, entry_path) in enumerate(entries) if entry_path == path), None)
+            if position is None:
+                return QModelIndex()
+            self._fetch_to(self.nodes[parent_path], position + 1)
+            node = self.nodes.get(path)
+            if node is None:
+                return QModelIndex()
+        if node is self.root:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    # --- Headers of the current document ---
+
+    def set_headers(self, path, headers):
+        """Shows `headers` under the document at `path`, removing any other document's headers."""
+        with self._changing():
+            if self.outline_path and self.outline_path != path:
+                self._replace_header_rows(self.nodes.get(self.outline_path), [])
+            self.outline_path, self.outline = path, list(headers)
+            self._replace_header_rows(self.nodes.get(path) if path else None, self.outline)
+
+    def apply_outline_changes(self, changes, header_count):
+        """
+        Applies the editor's renamed, removed and inserted header ops to the
+        current document's outline and header rows. Returns False if they
+        turned out to be out of step with the editor's `header_count` headers.
+        """
+        outline = self.outline
+        for kind, position, value in changes:
+            if kind == 'renamed' and position < len(outline):
+                outline[position] = value
+            elif kind == 'removed':
+                del outline[position:position + value]
+            elif kind == 'inserted':
+                outline[position:position] = value
+        node = self.nodes.get(self.outline_path) if self.outline_path else None
+        if node is None:
+            return len(outline) == header_count
+        with self._changing():
+            parent_index = self.createIndex(node.row, 0, node)
+            for kind, position, value in changes:
+                if position > len(node.children):
+                    break
+                if kind == 'renamed' and position < len(node.children):
+                    node.children[position].title = value[1].strip()
+                    changed = self.index(position, 0, parent_index)
+                    self.dataChanged.emit(changed, changed)
+                elif kind == 'removed':
+                    count = min(value, len(node.children) - position)
+                    if count > 0:
+                        self.beginRemoveRows(parent_index, position, position + count - 1)
+                        del node.children[position:position + count]
+                        self._renumber(node, position)
+                        self.endRemoveRows()
+                elif kind == 'inserted' and value:
+                    self.beginInsertRows(parent_index, position, position + len(value) - 1)
+                    node.children[position:position] = [self._header_node(node, position + i, header) for i, header in enumerate(value)]
+                    self._renumber(node, position)
+                    self.endInsertRows()
+        return len(node.children) == len(outline) == header_count
+
+    # --- Internals ---
+
+    @contextmanager
+    def _changing(self):
+        previous, self.changing = self.changing, True
+        try:
+            yield
+        finally:
+            self.changing = previous
+
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def _index_of(self, node):
+        return QModelIndex() if node is self.root else self.createIndex(node.row, 0, node)
+
+    def _create_node(self, parent, row, kind, path):
+        node = TreeNode(kind, path, parent, row)
+        self.nodes[path] = node
+        if kind == "file" and path == self.outline_path:
+            node.children = [self._header_node(node, i, header) for i, header in enumerate(self.outline)]
+        return node
+
+    def _header_node(self, parent, row, header):
+        level, title = header
+        return TreeNode("header", None, parent, row, title=title.strip())
+
+    def _fetch_to(self, node, count):
+        """Creates the folder's rows up to `count`."""
+        entries = self.listing.get(node.path, ())
+        first, last = len(node.children), min(count, len(entries))
+        node.fetched = True
+        if last <= first:
+            return
+        with self._changing():
+            self.beginInsertRows(self._index_of(node), first, last - 1)
+            node.children.extend(self._create_node(node, row, *entries[row]) for row in range(first, last))
+            self.endInsertRows()
+
+    def _reconcile(self, node, old_entries):
+        """Makes a folder's rows a prefix of its new entries again, changing only what differs."""
+        entries = self.listing.get(node.path, [])
+        if node.fetched and len(node.children) == len(old_entries):
+            target = entries
+        elif node.children:
+            last = node.children[-1]
+            keys = [sort_key(kind, p) for kind, p in entries]
+            target = entries[:bisect_right(keys, sort_key(last.kind, last.path))]
+        else:
+            return
+
+        wanted = set(target)
+        parent_index = self._index_of(node)
+        # Removals run back to front so earlier rows keep their numbers
+        row = len(node.children) - 1
+        while row >= 0:
+            if (node.children[row].kind, node.children[row].path) in wanted:
+                row -= 1
+                continue
+            end = row
+            while row >= 0 and (node.children[row].kind, node.children[row].path) not in wanted:
+                row -= 1
+            self.beginRemoveRows(parent_index, row + 1, end)
+            for removed in node.children[row + 1:end + 1]:
+                self._forget(removed)
+            del node.children[row + 1:end + 1]
+            self._renumber(node, row + 1)
+            self.endRemoveRows()
+
+        # What is left is in target order, so the missing entries are inserted in runs
+        row = 0
+        position = 0
+        while position < len(target):
+            if row < len(node.children) and (node.children[row].kind, node.children[row].path) == target[position]:
+                row += 1
+                position += 1
+                continue
+            run_end = position
+            current = (node.children[row].kind, node.children[row].path) if row < len(node.children) else None
+            while run_end < len(target) and target[run_end] != current:
+                run_end += 1
+            self.beginInsertRows(parent_index, row, row + run_end - position - 1)
+            node.children[row:row] = [self._create_node(node, row + i, *target[position + i]) for i in range(run_end - position)]
+            self._renumber(node, row)
+            self.endInsertRows()
+            row += run_end - position
+            position = run_end
+
+    def _forget(self, node):
+        if node.kind == "header":
+            return
+        if self.nodes.get(node.path) is node:
+            del self.nodes[node.path]
+        for child in node.children:
+            self._forget(child)
+
+    def _replace_header_rows(self, node, headers):
+        if node is None:
+            return
+        parent_index = self.createIndex(node.row, 0, node)
+        if node.children:
+            self.beginRemoveRows(parent_index, 0, len(node.children) - 1)
+            node.children = []
+            self.endRemoveRows()
+        if headers:
+            self.beginInsertRows(parent_index, 0, len(headers) - 1)
+            node.children = [self._header_node(node, i, header) for i, header in enumerate(headers)]
+            self.endInsertRows()
+
+    @staticmethod
+    def _renumber(node, start):
+        for row in range(start, len(node.children)):
+            node.children[row].row = row
@@ -1,14 +1,97 @@
 # tabula_writer/panels_qt/editor_panel_qt.py
-from PyQt6.QtWidgets import QMessageBox
+from PyQt6.QtWidgets import QMessageBox, QFileDialog
 from PyQt6.QtGui import QTextCursor
 from PyQt6.QtCore import pyqtSignal, QTimer
 from .base_panel_qt import BasePanel
 from ..popups_qt.comment_popup_qt import CommentPopup
+from ..utils.worker_qt import Worker
+from ..utils.block_tracker_qt import BlockTracker
+from bisect import bisect_left
+from collections import Counter, deque
+import codecs
 import os
 import re
 
+FOOTNOTE_PATTERN = re.compile(r'\[\^(\d+)\]')
+
+HEADER_PATTERN = re.compile(r'^(#+\s*)(.*)')
+
+def footnotes_in_block(text):
+    return tuple(FOOTNOTE_PATTERN.findall(text))
+
+def header_in_block(text):
+    match = HEADER_PATTERN.match(text)
+    return match.groups() if match else None
+
+def diff_headers(index, old_headers, new_headers):
+    """
+    Describes how old_headers, starting at outline position index, became
+    new_headers: a list of ('renamed', position, header), ('removed',
+    position, count) and ('inserted', position, headers) changes.
+    """
+    prefix = 0
+    while prefix < min(len(old_headers), len(new_headers)) and old_headers[prefix] == new_headers[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(old_headers), len(new_headers)) - prefix
+           and old_headers[-1 - suffix] == new_headers[-1 - suffix]):
+        suffix += 1
+    old_middle = old_headers[prefix:len(old_headers) - suffix]
+    new_middle = new_headers[prefix:len(new_headers) - suffix]
+    position = index + prefix
+    if len(old_middle) == len(new_middle):
+        return [('renamed', position + i, header) for i, header in enumerate(new_middle)]
+    changes = []
+    if old_middle:
+        changes.append(('removed', position, len(old_middle)))
+    if new_middle:
+        changes.append(('inserted', position, new_middle))
+    return changes
+
+# Files larger than this open progressively: the first screenful at once, the rest in chunks.
+PROGRESSIVE_LOAD_BYTES = 512 * 1024
+FIRST_CHUNK_BYTES = 16 * 1024
+APPEND_CHUNK_BYTES = 32 * 1024
+
+def read_leading_lines(path, size):
+    """
+    Reads whole lines from the start of a file, up to about size bytes.
+    Returns the text and the byte offset where the rest of the file starts.
+    """
+    with open(path, "rb") as f:
+        data = f.read(size)
+    if len(data) == size:
+        cut = data.rfind(b"\n") + 1
+        if cut:
+            data = data[:cut]
+    # Without a line break the cut may split a character; its bytes are left for the rest
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text = decoder.decode(data, final=len(data) < size)
+    return text.replace("\r\n", "\n"), len(data) - len(decoder.getstate()[0])
+
+def read_file_chunks(path, offset, chunk_size, on_chunk, is_cancelled):
+    """Reads a file from offset, handing on_chunk pieces of text that end on line boundaries."""
+    # Decoding incrementally keeps a character that straddles two reads whole
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        carry = ""
+        while not is_cancelled():
+            data = f.read(chunk_size)
+            if not data:
+                break
+            text = carry + decoder.decode(data)
+            cut = text.rfind("\n") + 1
+            carry = text[cut:]
+            if cut:
+                on_chunk(text[:cut].replace("\r\n", "\n"))
+        if not is_cancelled():
+            carry += decoder.decode(b"", final=True)
+            if carry:
+                on_chunk(carry.replace("\r\n", "\n"))
+
 class EditorPanel(BasePanel):
-    headers_updated = pyqtSignal(list)
+    outline_changed = pyqtSignal(list)
     file_saved = pyqtSignal(str, str)
 
     def __init__(self, app_instance):
@@ -16,19 +99,35 @@ class EditorPanel(BasePanel):
         
         self.setObjectName("EditorPanel")
         self.current_path = None
-        self.current_footnotes = set()
+
+        # Footnote markers are counted per block as the text changes. Numbers whose count drops
+        # to zero are collected, and on_text_changed deletes their comments if the edit was the user's.
+        self.footnote_counts = Counter()
+        self.removed_footnotes = set()
+        self.footnote_tracker = BlockTracker(self.text_edit.document(), footnotes_in_block, self)
+        self.footnote_tracker.blocks_changed.connect(self._on_footnote_blocks_changed)
+
+        # The outline is kept per block too; edits emit outline_changed with the headers that
+        # were inserted, removed or renamed. Whole-text replacements are not reported, since
+        # whoever loads a file rebuilds the outline from the returned header list.
+        self.replacing_text = False
+        # Block numbers of the header lines in order, so an edit finds its outline position by bisection
+        self.header_blocks = []
+        self.header_tracker = BlockTracker(self.text_edit.document(), header_in_block, self)
+        self.header_tracker.blocks_changed.connect(self._on_header_blocks_changed)
         
         self.is_focus_mode = False
 
-        self.header_update_timer = QTimer(self)
-        self.header_update_timer.setSingleShot(True)
-        self.header_update_timer.setInterval(500)
-        self.header_update_timer.timeout.connect(self._scan_and_update_headers)
-
-        self.rehighlight_timer = QTimer(self)
-        self.rehighlight_timer.setSingleShot(True)
-        self.rehighlight_timer.setInterval(300)
-        self.rehighlight_timer.timeout.connect(self.highlighter.rehighlight)
+        # Progressive loading: chunks read by a worker wait here and are appended one per timer tick,
+        # so typing and scrolling stay responsive while the rest of a large file streams in.
+        self.is_loading = False
+        self.load_worker = None
+        self.load_generation = 0
+        self.pending_chunks = deque()
+        self.reader_done = False
+        self.append_timer = QTimer(self)
+        self.append_timer.setInterval(0)
+        self.append_timer.timeout.connect(self._append_next_chunk)
 
     def toggle_text_format(self, format_type):
         cursor = self.text_edit.textCursor()
@@ -57,22 +156,23 @@ class EditorPanel(BasePanel):
     def load_file(self, path):
         if self.is_focus_mode:
             self.toggle_focus_mode()
+        self._cancel_progressive_load()
         
         self.current_path = path
         if not path:
              self.text_edit.clear()
              self.text_modified = False
+             self.start_word_session()
              return []
 
         try:
+            if os.path.getsize(path) > PROGRESSIVE_LOAD_BYTES:
+                return self._load_progressively(path)
+
             with open(path, "r", encoding="utf-8") as f: content = f.read()
             
-            self.text_edit.textChanged.disconnect()
-            self.text_edit.setPlainText(content)
-            self.text_edit.textChanged.connect(self.on_text_changed)
-            
-            self.current_footnotes = set(re.findall(r'\[\^(\d+)\]', content))
-            headers = re.findall(r'^(#+\s*)(.*)', content, re.MULTILINE)
+            self._replace_text(content)
+            headers = self.headers
 
             self.text_modified = False
             self.save_status_changed.emit()
@@ -82,31 +182,187 @@ class EditorPanel(BasePanel):
         except Exception as e:
             self.text_edit.setPlainText(f"Error loading file: {e}")
             self.current_path = None
-            self.current_footnotes = set()
+            self.removed_footnotes.clear()
             return [] 
 
+    def _load_progressively(self, path):
+        """
+        Shows the first screenful of a large file at once and streams the rest
+        in from a worker. Only the shown text is highlighted before the editor
+        is usable; appended chunks are highlighted as they arrive. Returns the
+        headers of the first chunk; headers further on reach outline_changed
+        as insertions while their chunks are appended.
+        """
+        content, offset = read_leading_lines(path, FIRST_CHUNK_BYTES)
+
+        # Appended chunks must not become undo steps the user could take back
+        self.text_edit.document().setUndoRedoEnabled(False)
+        self._replace_text(content)
+
+        self.is_loading = True
+        self.reader_done = False
+        self.load_generation += 1
+        generation = self.load_generation
+        worker = Worker(read_file_chunks, path, offset, APPEND_CHUNK_BYTES)
+        worker.kwargs['on_chunk'] = worker.signals.progress.emit
+        worker.kwargs['is_cancelled'] = worker.is_cancelled
+        worker.signals.progress.connect(lambda chunk: self._queue_chunk(chunk, generation))
+        worker.signals.error.connect(lambda error: self._on_load_error(error, generation))
+        worker.signals.finished.connect(lambda: self._on_reader_finished(generation))
+        self.load_worker = worker
+        self.app.threadpool.start(worker)
+
+        self.text_modified = False
+        self.save_status_changed.emit()
+        self.word_count_changed.emit()
+        self.app.status_bar.showMessage(f"Loading {os.path.basename(path)}...")
+        return self.headers
+
+    def _replace_text(self, content):
+        """Swaps in a new document text without it counting as an edit."""
+        self.text_edit.textChanged.disconnect()
+        self.replacing_text = True
+        self.text_edit.setPlainText(content)
+        self.replacing_text = False
+        self.text_edit.textChanged.connect(self.on_text_changed)
+        self.removed_footnotes.clear()
+        self.start_word_session()
+
+    def _queue_chunk(self, chunk, generation):
+        if generation != self.load_generation:
+            return
+        self.pending_chunks.append(chunk)
+        if not self.append_timer.isActive():
+            self.append_timer.start()
+
+    def _on_reader_finished(self, generation):
+        if generation != self.load_generation:
+            return
+        self.reader_done = True
+        self.load_worker = None
+        if not self.append_timer.isActive():
+            self.append_timer.start()
+
+    def _on_load_error(self, error, generation):
+        if generation != self.load_generation:
+            return
+        self._cancel_progressive_load()
+        path = self.current_path
+        # The editor holds only part of the file now, so it must never be saved over it
+        self.current_path = None
+        choice = QMessageBox.critical(
+            self.app, "Load Error",
+            f"Failed to read document:\n{path}\n\nError: {error[1]}\n\n"
+            "Only part of it was loaded, and the editor will not save over the original. "
+            "Save the text in the editor as a new document?",
+            QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard)
+        if choice == QMessageBox.StandardButton.Save:
+            self.save_partial_copy(path)
+        else:
+            self.app.status_bar.showMessage("Partially loaded document will not be saved.")
+
+    def save_partial_copy(self, original_path):
+        """Lets the user keep a partially loaded document, and what was typed into it, under a new name."""
+        stem, ext = os.path.splitext(original_path)
+        new_path, _ = QFileDialog.getSaveFileName(self.app, "Save Partial Document", f"{stem} (partial){ext}",
+                                                  "Markdown Files (*.md)")
+        if not new_path:
+            self.app.status_bar.showMessage("Partially loaded document will not be saved.")
+            return
+        self.current_path = new_path
+        self.text_modified = True
+        self.save_file()
+
+    def _append_next_chunk(self):
+        if self.pending_chunks:
+            cursor = QTextCursor(self.text_edit.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            words_before = self.word_count
+            self.text_edit.textChanged.disconnect()
+            # Highlighting here shares the layout pass of the insertion; a rehighlight made
+            # later, e.g. only once a block scrolls into view, lays out the whole document again
+            cursor.insertText(self.pending_chunks.popleft())
+            self.text_edit.textChanged.connect(self.on_text_changed)
+            # Loaded words are not the writer's; those typed meanwhile stay in the session delta
+            self.session_start_words += self.word_count - words_before
+        if not self.pending_chunks:
+            self.append_timer.stop()
+            if self.reader_done:
+                self._finish_progressive_load()
+
+    def _finish_progressive_load(self):
+        self.is_loading = False
+        self.text_edit.document().setUndoRedoEnabled(True)
+        self.word_count_changed.emit()
+        self.app.status_bar.showMessage("Ready", 2000)
+
+    def _cancel_progressive_load(self):
+        """Abandons a load in progress, e.g. because another file is being opened."""
+        if not self.is_loading:
+            return
+        if self.load_worker:
+            self.load_worker.cancel()
+            self.load_worker = None
+        self.load_generation += 1
+        self.pending_chunks.clear()
+        self.append_timer.stop()
+        self.is_loading = False
+        self.text_edit.document().setUndoRedoEnabled(True)
+
     def on_text_changed(self):
         super().on_text_changed()
 
-        self.header_update_timer.start()
-        self.rehighlight_timer.start()
+        # Edited blocks are rehighlighted by the highlighter itself, so no full pass is needed here
+        deleted_footnotes = [num for num in self.removed_footnotes if num not in self.footnote_counts]
+        self.removed_footnotes.clear()
+        if deleted_footnotes and self.current_path:
+            self.app.delete_comments_for_footnotes(deleted_footnotes, self.current_path)
 
-        if not self.current_path:
-            return
+    @property
+    def current_footnotes(self):
+        return set(self.footnote_counts)
 
-        new_content = self.get_content()
-        new_footnotes = set(re.findall(r'\[\^(\d+)\]', new_content))
-        deleted_footnotes = self.current_footnotes - new_footnotes
-        if deleted_footnotes:
-            self.app.delete_comments_for_footnotes(list(deleted_footnotes), self.current_path)
-        self.current_footnotes = new_footnotes
+    def _on_footnote_blocks_changed(self, first, old_values, new_values):
+        for numbers in old_values:
+            for num in numbers:
+                self.footnote_counts[num] -= 1
+                if not self.footnote_counts[num]:
+                    del self.footnote_counts[num]
+                    self.removed_footnotes.add(num)
+        for numbers in new_values:
+            self.footnote_counts.update(numbers)
     
-    def _scan_and_update_headers(self):
-        content = self.get_content()
-        headers = re.findall(r'^(#+\s*)(.*)', content, re.MULTILINE)
-        self.headers_updated.emit(headers)
+    @property
+    def headers(self):
+        """The document's (marker, title) headers in order."""
+        values = self.header_tracker.values
+        return [values[number] for number in self.header_blocks]
+
+    @property
+    def header_count(self):
+        return len(self.header_blocks)
+
+    def _on_header_blocks_changed(self, first, old_values, new_values):
+        index = bisect_left(self.header_blocks, first)
+        end = bisect_left(self.header_blocks, first + len(old_values))
+        new_blocks = [first + i for i, header in enumerate(new_values) if header]
+        shift = len(new_values) - len(old_values)
+        if shift:
+            self.header_blocks[index:] = new_blocks + [number + shift for number in self.header_blocks[end:]]
+        else:
+            self.header_blocks[index:end] = new_blocks
+
+        if self.replacing_text:
+            return
+        old_headers = [header for header in old_values if header]
+        new_headers = [header for header in new_values if header]
+        if old_headers != new_headers:
+            self.outline_changed.emit(diff_headers(index, old_headers, new_headers))
 
     def save_file(self):
+        # Saving before the whole file is in the editor would truncate it
+        if self.is_loading:
+            return False
         if self.current_path and self.text_modified:
             try:
                 content_to_save = self.get_content()
@@ -125,8 +381,7 @@ class EditorPanel(BasePanel):
             QMessageBox.warning(self, "Footnote Error", "Please save the document before adding a footnote.")
             return
 
-        content = self.get_content()
-        existing_numbers = [int(n) for n in re.findall(r'\[\^(\d+)\]', content)]
+        existing_numbers = [int(n) for n in self.footnote_counts]
         next_num = max(existing_numbers) + 1 if existing_numbers else 1
 
         self.text_edit.textCursor().insertText(f"[^{next_num}]")
@@ -5,7 +5,6 @@ from .base_panel_qt import BasePanel
 from PyQt6.QtCore import pyqtSignal, Qt, QTimer
 from PyQt6.QtGui import QPainter, QColor, QBrush, QPen
 import os
-import re
 from ..popups_qt.full_comment_viewer_popup_qt import FullCommentViewerPopup
 from ..utils.nav_qt import handle_panel_navigation
 
@@ -92,7 +91,8 @@ class NotesPanel(QFrame):
         self.loaded_comments = []
         self.current_note = None
         
-        self.main_note_path = os.path.join(self.app.notes_path, "_GeneralNotes.md")
+        self.main_note_path = self.app.project.main_note_path
+        self.comments_document = None
         
         header_label = QLabel("Notes")
         header_label.setObjectName("PanelHeader")
@@ -120,6 +120,7 @@ class NotesPanel(QFrame):
         self.general_notes_view.setStyleSheet("background-color: transparent;")
         self.comments_view_scroll.setStyleSheet("background-color: transparent; border: none;")
 
+        self.app.project.comments_changed.connect(self.on_comments_changed)
         self.load_main_note()
 
     def load_main_note(self):
@@ -137,44 +138,34 @@ class NotesPanel(QFrame):
             self.general_notes_view.text_edit.setPlainText("")
         
         self.general_notes_view.text_modified = False
+        self.general_notes_view.start_word_session()
 
     def load_comments_for_document(self, document_path):
+        self.comments_document = document_path
         self.loaded_comments.clear()
         while self.comments_layout.count():
             child = self.comments_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
-            
-        doc_base_name = os.path.splitext(os.path.basename(document_path))[0]
-        sanitized_doc_name = re.sub(r'[^\w\-_\.]', '_', doc_base_name)
-        comments_dir = os.path.join(self.app.notes_path, 'comments', sanitized_doc_name)
 
         no_comments_label = QLabel("No comments for this document.")
         no_comments_label.setStyleSheet("background-color: transparent; border: none;")
         
-        if not os.path.exists(comments_dir) or not os.listdir(comments_dir):
+        comments = self.app.project.comments_for(document_path)
+        if not comments:
             self.comments_layout.addWidget(no_comments_label)
         else:
-            comment_files = sorted(os.listdir(comments_dir))
-            for filename in comment_files:
-                if filename.endswith(".md"):
-                    path = os.path.join(comments_dir, filename)
-                    with open(path, 'r', encoding='utf-8') as f: full_text = f.read()
-                    fn_match = re.search(r'\[\^(\d+)\]', full_text)
-                    if fn_match:
-                        body = "\n".join([line for line in full_text.split('\n') if not (line.startswith('#') or line.startswith('Referencing:') or line.startswith('Date:'))])
-                        comment_data = {
-                            'footnote_number': fn_match.group(1), 
-                            'body_text': body.strip(),
-                            'full_text': full_text,
-                            'path': path
-                        }
-                        self.loaded_comments.append(comment_data)
-                        preview = CommentPreviewWidget(comment_data, self)
-                        self.comments_layout.addWidget(preview)
+            for comment_data in comments:
+                self.loaded_comments.append(comment_data)
+                preview = CommentPreviewWidget(comment_data, self)
+                self.comments_layout.addWidget(preview)
         
         self.stacked_widget.setCurrentWidget(self.comments_view_scroll)
 
+    def on_comments_changed(self, document_path):
+        if document_path == self.comments_document:
+            self.load_comments_for_document(document_path)
+
     def get_comment_data_by_number(self, number):
         for data in self.loaded_comments:
             if data['footnote_number'] == number:
@@ -1,9 +1,74 @@
-from PyQt6.QtWidgets import QTextEdit
-from PyQt6.QtGui import QPainter, QColor, QLinearGradient, QFont, QSyntaxHighlighter, QTextCharFormat
-from PyQt6.QtCore import Qt, QRect, pyqtSignal, QRegularExpression, pyqtProperty
+from PyQt6.QtWidgets import QTextEdit, QCompleter
+from PyQt6.QtGui import QPainter, QColor, QLinearGradient, QFont, QSyntaxHighlighter, QTextCharFormat, QTextCursor, QTextLayout
+from PyQt6.QtCore import Qt, QRect, pyqtSignal, QRegularExpression, pyqtProperty, QStringListModel, QTimer
 import re
-from spellchecker import SpellChecker
+from itertools import groupby
 from tabula_writer.utils.nav_qt import handle_editor_navigation
+from tabula_writer.utils.spell_cache import get_spell_cache
+from tabula_writer.utils.worker_qt import Worker
+
+WORD_PATTERN = re.compile(r"\b[a-zA-Z']+\b")
+HEADER_PATTERN = re.compile(r'^(#+)\s(.*)')
+
+def utf16_offsets(text):
+    """
+    Returns a function mapping Python string offsets in text to the UTF-16
+    offsets Qt uses. They only differ after characters outside the BMP.
+    """
+    if len(text.encode('utf-16-le')) == 2 * len(text):
+        return lambda offset: offset
+    qt_offsets = [0]
+    for char in text:
+        qt_offsets.append(qt_offsets[-1] + (2 if ord(char) > 0xFFFF else 1))
+    return qt_offsets.__getitem__
+
+
+def unlinked_spans(word_spans, link_spans):
+    """
+    Yields the (start, end) word spans that overlap none of the link spans.
+    Both are walked once in order, so a block costs one pass however many
+    words or links it holds. word_spans must be in ascending order.
+    """
+    merged = []
+    for start, end in sorted(link_spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    i = 0
+    for start, end in word_spans:
+        while i < len(merged) and merged[i][1] <= start:
+            i += 1
+        if i == len(merged) or merged[i][0] >= end:
+            yield start, end
+
+
+def format_ranges(length, spans):
+    """
+    Turns (start, length, format) spans, each painted over the ones before it
+    as QSyntaxHighlighter.setFormat() would, into the FormatRanges of a block
+    `length` UTF-16 units long.
+    """
+    formats = [None] * length
+    for start, count, text_format in spans:
+        start, end = max(start, 0), min(start + count, length)
+        if start < end:
+            formats[start:end] = [text_format] * (end - start)
+    ranges = []
+    position = 0
+    for text_format, run in groupby(formats):
+        count = len(list(run))
+        if text_format is not None:
+            format_range = QTextLayout.FormatRange()
+            format_range.start, format_range.length, format_range.format = position, count, text_format
+            ranges.append(format_range)
+        position += count
+    return ranges
+
+
+# Block states set by the highlighter, so blocks that depend on outside settings can be found again
+PLAIN_BLOCK = 0
+HEADER_BLOCK = 1
 
 class MarkdownHighlighter(QSyntaxHighlighter):
     # The __init__ method is now corrected to accept the app_instance
@@ -12,12 +77,31 @@ class MarkdownHighlighter(QSyntaxHighlighter):
         self.theme = theme
         self.app = app_instance # Store a reference to the main app
 
+        self._build_formats()
+        # Set while the highlighter repaints blocks itself, so panels do not take it for an edit
+        self.repainting = False
+        # One dictionary and verdict cache for all panels, instead of a SpellChecker per highlighter
+        self.spell_cache = get_spell_cache()
+        # Words seen by highlightBlock without a verdict yet, each with the blocks it was seen in.
+        # They are checked on a worker in one batch per pass, and afterwards only the blocks
+        # that queued a misspelled word are repainted.
+        self.pending_words = {}
+        self.checking_words = {}
+        self.spell_worker = None
+        self.spell_timer = QTimer(self)
+        self.spell_timer.setSingleShot(True)
+        self.spell_timer.setInterval(50)
+        self.spell_timer.timeout.connect(self._start_spell_check)
+
+    def _build_formats(self):
+        """Creates the formats and rules for the current theme and empties the header format cache."""
         self.bold_format = self._create_format(bold=True)
         self.italic_format = self._create_format(italic=True)
         self.wikilink_format = self._create_format(underline=True, color=self.theme['link_beige'], bold=True)
         self.footnote_format = self._create_format(underline=True, color=self.theme['accent_red'])
         self.tag_format = self._create_format(color=self.theme['link_beige'], bold=True)
-        
+        self.link_formats = (self.wikilink_format, self.footnote_format, self.tag_format)
+
         self.misspelled_format = QTextCharFormat()
         self.misspelled_format.setUnderlineColor(QColor("red"))
         self.misspelled_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.SpellCheckUnderline)
@@ -32,7 +116,30 @@ class MarkdownHighlighter(QSyntaxHighlighter):
             (QRegularExpression(r"(\[\^)(\d+)(\])"), self.footnote_format, [1, 3]),
             (QRegularExpression(r"(@\w+)"), self.tag_format, []) 
         ]
-        self.spell_checker = SpellChecker()
+        # Header formats by level, valid for header_base_size; headers scale with the base font size
+        self.header_formats = {}
+        self.header_base_size = None
+
+    def set_theme(self, theme):
+        """Switches to a new theme, rebuilding every cached format."""
+        self.theme = theme
+        self._build_formats()
+        self.repainting = True
+        self.rehighlight()
+        self.repainting = False
+
+    def _header_format(self, level):
+        """Returns the format for a header of the given level, creating it once per base font size."""
+        base_size = self.app.base_font_size
+        if base_size != self.header_base_size:
+            self.header_formats = {}
+            self.header_base_size = base_size
+        header_format = self.header_formats.get(level)
+        if header_format is None:
+            header_size = max(12, base_size + (18 - (level * 4)))
+            header_format = self._create_format(point_size=header_size, bold=True)
+            self.header_formats[level] = header_format
+        return header_format
 
     def _create_format(self, point_size=None, bold=False, italic=False, underline=False, color="#3d3d3d"):
         fmt = QTextCharFormat()
@@ -45,38 +152,120 @@ class MarkdownHighlighter(QSyntaxHighlighter):
         return fmt
 
     def highlightBlock(self, text):
-        header_match = re.match(r'^(#+)\s(.*)', text)
+        state, spans = self._highlight(text, self.currentBlock())
+        self.setCurrentBlockState(state)
+        for start, length, text_format in spans:
+            self.setFormat(start, length, text_format)
+
+    def _highlight(self, text, block):
+        """Returns a block's state and its (start, length, format) spans, later spans painting over earlier ones."""
+        spans = []
+        header_match = HEADER_PATTERN.match(text)
         if header_match:
-            hash_count = len(header_match.group(1))
-            header_size = max(12, self.app.base_font_size + (18 - (hash_count * 4)))
-            header_format = self._create_format(point_size=header_size, bold=True)
-            self.setFormat(0, len(text), header_format)
+            spans.append((0, len(text), self._header_format(len(header_match.group(1)))))
 
+        # Spans covered by wikilinks, footnotes and tags, which are never marked as misspelled
+        link_spans = []
         for pattern, base_format, marker_groups in self.rules:
+            is_link = base_format in self.link_formats
             it = pattern.globalMatch(text)
             while it.hasNext():
                 match = it.next()
                 content_group_index = 2 if len(marker_groups) > 0 and match.lastCapturedIndex() >= 2 else 0
-                self.setFormat(match.capturedStart(content_group_index), match.capturedLength(content_group_index), base_format)
+                start, length = match.capturedStart(content_group_index), match.capturedLength(content_group_index)
+                spans.append((start, length, base_format))
+                if is_link:
+                    link_spans.append((start, start + length))
                 for group_index in marker_groups:
-                    self.setFormat(match.capturedStart(group_index), match.capturedLength(group_index), self.hide_format)
-        
-        words = re.findall(r"\b[a-zA-Z']+\b", text)
-        if not words: return
-        
-        misspelled = self.spell_checker.unknown(words)
-        for word in misspelled:
-            pattern = QRegularExpression(fr"\b{word}\b")
-            it = pattern.globalMatch(text)
-            while it.hasNext():
-                match = it.next()
-                is_link = False
-                for i in range(match.capturedStart(), match.capturedEnd()):
-                    if self.format(i) in (self.wikilink_format, self.footnote_format, self.tag_format):
-                        is_link = True
-                        break
-                if not is_link:
-                    self.setFormat(match.capturedStart(), match.capturedLength(), self.misspelled_format)
+                    spans.append((match.capturedStart(group_index), match.capturedLength(group_index), self.hide_format))
+        state = HEADER_BLOCK if header_match else PLAIN_BLOCK
+
+        word_matches = list(WORD_PATTERN.finditer(text))
+        if not word_matches:
+            return state, spans
+
+        misspelled, unchecked = self.spell_cache.lookup({match.group() for match in word_matches})
+        if unchecked:
+            self.queue_spell_check(unchecked, block)
+        if not misspelled:
+            return state, spans
+
+        to_qt = utf16_offsets(text)
+        for start, end in unlinked_spans(((to_qt(match.start()), to_qt(match.end()))
+                                          for match in word_matches if match.group() in misspelled),
+                                         link_spans):
+            spans.append((start, end - start, self.misspelled_format))
+        return state, spans
+
+    def rehighlight_blocks(self, blocks):
+        """
+        Rehighlights the given blocks, in document order, with a single layout
+        pass. Every rehighlightBlock() lays out the whole document again and
+        reports a text change, so instead each block's formats are set on its
+        layout and the span the blocks cover is marked dirty once.
+        """
+        if not blocks:
+            return
+        self.repainting = True
+        for block in blocks:
+            state, spans = self._highlight(block.text(), block)
+            block.setUserState(state)
+            block.layout().setFormats(format_ranges(block.length() - 1, spans))
+        first, last = blocks[0], blocks[-1]
+        self.document().markContentsDirty(first.position(), last.position() + last.length() - first.position())
+        self.repainting = False
+
+    def queue_spell_check(self, words, block=None):
+        """Schedules words for a background dictionary check, remembering the block to repaint."""
+        for word in words:
+            blocks = self.pending_words.setdefault(word, [])
+            if block is not None and (not blocks or blocks[-1] != block):
+                blocks.append(block)
+        if self.spell_worker is None and not self.spell_timer.isActive():
+            self.spell_timer.start()
+
+    def _start_spell_check(self):
+        if self.spell_worker is not None or not self.pending_words:
+            return
+        self.checking_words, self.pending_words = self.pending_words, {}
+        worker = Worker(self.spell_cache.check, set(self.checking_words))
+        worker.signals.result.connect(self._on_spell_checked)
+        worker.signals.finished.connect(self._on_spell_check_finished)
+        self.spell_worker = worker
+        self.app.threadpool.start(worker)
+
+    def _on_spell_checked(self, unknown_words):
+        """Repaints the blocks that queued a word the worker found to be misspelled."""
+        blocks = {}
+        for word in unknown_words:
+            for block in self.checking_words.get(word, ()):
+                if block.isValid() and block.document() == self.document():
+                    blocks[block.blockNumber()] = block
+        self.rehighlight_blocks([blocks[number] for number in sorted(blocks)])
+
+    def _on_spell_check_finished(self):
+        self.spell_worker = None
+        self.checking_words = {}
+        if self.pending_words:
+            self.spell_timer.start()
+
+    def rehighlight_where(self, predicate):
+        """
+        Rehighlights only the blocks for which predicate(block) is true. Edits
+        are already rehighlighted block by block by QSyntaxHighlighter; this is
+        for blocks whose formatting changed for outside reasons.
+        """
+        blocks = []
+        block = self.document().firstBlock()
+        while block.isValid():
+            if predicate(block):
+                blocks.append(block)
+            block = block.next()
+        self.rehighlight_blocks(blocks)
+
+    def rehighlight_headers(self):
+        """Rehighlights header blocks, whose point size follows the base font size."""
+        self.rehighlight_where(lambda block: block.userState() == HEADER_BLOCK)
 
 
 class InteractiveTextEdit(QTextEdit):
@@ -92,6 +281,16 @@ class InteractiveTextEdit(QTextEdit):
         self.blur_enabled = False
         self.verticalScrollBar().valueChanged.connect(self.ensure_centered)
         self._font_size = 18
+        # While a dynamicFontSize animation runs, header rehighlighting waits for its last frame
+        self.font_animating = False
+
+        # Suggests existing [[targets]] while a wikilink is being typed
+        self.wikilink_fragment = None
+        self.wikilink_model = QStringListModel(self)
+        self.wikilink_completer = QCompleter(self.wikilink_model, self)
+        self.wikilink_completer.setWidget(self)
+        self.wikilink_completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.wikilink_completer.activated.connect(self.insert_wikilink_completion)
 
     def get_font_size(self):
         return self._font_size
@@ -99,11 +298,21 @@ class InteractiveTextEdit(QTextEdit):
     def set_font_size(self, size):
         self._font_size = size
         self.setStyleSheet(f"font-size: {size}pt;")
-        if hasattr(self.parent_panel, 'highlighter'):
-            self.parent_panel.highlighter.rehighlight()
+        if not self.font_animating and hasattr(self.parent_panel, 'highlighter'):
+            self.parent_panel.highlighter.rehighlight_headers()
 
     dynamicFontSize = pyqtProperty(int, get_font_size, set_font_size)
 
+    def begin_font_animation(self):
+        """Stops font size steps from rehighlighting until end_font_animation."""
+        self.font_animating = True
+
+    def end_font_animation(self):
+        """Rehighlights once for the final font size of an animation."""
+        self.font_animating = False
+        if hasattr(self.parent_panel, 'highlighter'):
+            self.parent_panel.highlighter.rehighlight_headers()
+
     def toggle_typewriter_blur(self, enabled: bool):
         self.blur_enabled = enabled
         if enabled:
@@ -139,11 +348,50 @@ class InteractiveTextEdit(QTextEdit):
         painter.end()
 
     def keyPressEvent(self, event):
+        if self.wikilink_completer.popup().isVisible() and event.key() in (
+                Qt.Key.Key_Return, Qt.Key.Key_Enter, Qt.Key.Key_Escape, Qt.Key.Key_Tab, Qt.Key.Key_Backtab):
+            # Let the completer popup handle choosing or dismissing a suggestion
+            event.ignore()
+            return
         if handle_editor_navigation(self, event):
             return
         super().keyPressEvent(event)
         if self.blur_enabled:
             self.ensure_centered()
+        if event.text():
+            self.update_wikilink_completer()
+
+    def update_wikilink_completer(self):
+        popup = self.wikilink_completer.popup()
+        indexer = getattr(self.parent_panel.app, 'search_indexer', None)
+        cursor = self.textCursor()
+        text_before = cursor.block().text()[:cursor.positionInBlock()]
+        match = re.search(r'\[\[([^\[\]]{2,})$', text_before)
+        if not indexer or not match:
+            self.wikilink_fragment = None
+            popup.hide()
+            return
+
+        suggestions = indexer.suggest_wikilinks(match.group(1))
+        if not suggestions:
+            popup.hide()
+            return
+        self.wikilink_fragment = match.group(1)
+        self.wikilink_model.setStringList(suggestions)
+        popup.setCurrentIndex(self.wikilink_completer.completionModel().index(0, 0))
+        rect = self.cursorRect()
+        rect.setWidth(popup.sizeHintForColumn(0) + popup.verticalScrollBar().sizeHint().width())
+        self.wikilink_completer.complete(rect)
+
+    def insert_wikilink_completion(self, target):
+        if self.wikilink_fragment is None:
+            return
+        cursor = self.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.Left, QTextCursor.MoveMode.KeepAnchor, len(self.wikilink_fragment))
+        closing = "" if self.toPlainText()[cursor.selectionEnd():cursor.selectionEnd() + 2] == "]]" else "]]"
+        cursor.insertText(target + closing)
+        self.setTextCursor(cursor)
+        self.wikilink_fragment = None
 
     def get_link_at_position(self, position):
         cursor = self.document().findBlock(position)
@@ -1,64 +1,142 @@
 # tabula_writer/popups_qt/search_popup_qt.py
-from PyQt6.QtWidgets import (QVBoxLayout, QLabel, QLineEdit, QPushButton, 
+from PyQt6.QtWidgets import (QVBoxLayout, QLabel, QLineEdit, QPushButton,
                              QListWidget, QListWidgetItem, QHBoxLayout)
-from PyQt6.QtCore import pyqtSignal, Qt
+from PyQt6.QtCore import pyqtSignal, Qt, QTimer
 from .base_popup_qt import BasePopup
+from ..utils.worker_qt import Worker
+from ..utils.tag_query import is_boolean_query, boolean_search, parse_query, TagQueryError
 
 class SearchPopup(BasePopup):
     search_requested = pyqtSignal(str)
     open_file_requested = pyqtSignal(str)
 
-    def __init__(self, app_instance):
+    def __init__(self, search_indexer, files_info, open_file_callback, app_instance):
         super().__init__(app_instance.theme, parent=app_instance)
         self.app = app_instance
+        self.search_indexer = search_indexer
+        self.files_info = files_info
+        self.open_file_callback = open_file_callback
+
+        self.current_worker = None
+        # Bumped for every new search, so batches still queued from a stale worker are dropped
+        self.search_generation = 0
+        self.result_count = 0
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(150)
+        self.debounce_timer.timeout.connect(self.on_search)
+
         self.init_ui()
 
     def init_ui(self):
         self.setWindowTitle("Search Project")
-        
-        self.main_layout.addWidget(QLabel("Enter search query:"))
-        
+
+        self.main_layout.addWidget(QLabel("Enter search query (@tag, [[link]], AND/OR/NOT):"))
+
         search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
         self.search_button = QPushButton("Search")
         search_layout.addWidget(self.search_input)
         search_layout.addWidget(self.search_button)
         self.main_layout.addLayout(search_layout)
-        
+
         self.results_list = QListWidget()
         self.main_layout.addWidget(self.results_list)
 
         self.status_label = QLabel("Ready to search.")
         self.main_layout.addWidget(self.status_label)
-        
+
+        self.search_input.textChanged.connect(self.on_query_changed)
         self.search_input.returnPressed.connect(self.on_search)
         self.search_button.clicked.connect(self.on_search)
         self.results_list.itemDoubleClicked.connect(self.on_item_activated)
+        self.finished.connect(self.cancel_search)
+
+    def on_query_changed(self, text):
+        """Searches as the user types, once they pause for the debounce interval."""
+        if len(text.strip()) >= 2:
+            self.debounce_timer.start()
+        else:
+            self.debounce_timer.stop()
+            self.cancel_search()
 
     def on_search(self):
+        self.debounce_timer.stop()
         query = self.search_input.text().strip()
-        if query:
-            self.results_list.clear()
-            self.status_label.setText("Searching...")
-            self.search_requested.emit(query)
+        if not query:
+            return
+
+        self.cancel_search()
+        self.search_generation += 1
+        generation = self.search_generation
+        self.results_list.clear()
+        self.result_count = 0
+
+        # Queries naming @tags or [[links]], or using AND/OR/NOT, select whole files instead of ranking lines
+        boolean = is_boolean_query(query)
+        if boolean:
+            # Checked here so a typo such as a trailing AND is reported rather than found nothing
+            try:
+                parse_query(query)
+            except TagQueryError as e:
+                self.status_label.setText(f"Invalid query: {e}")
+                return
+        self.status_label.setText("Searching...")
+        self.search_requested.emit(query)
+
+        if boolean:
+            worker = Worker(boolean_search, self.search_indexer, query)
+        else:
+            worker = Worker(self.search_indexer.search, query)
+        worker.kwargs['on_batch'] = worker.signals.progress.emit
+        worker.kwargs['is_cancelled'] = worker.is_cancelled
+        worker.signals.progress.connect(lambda batch: self.append_search_results(batch, generation))
+        worker.signals.finished.connect(lambda: self.search_finished(generation))
+        self.current_worker = worker
+        self.app.current_search_worker = worker
+        self.app.threadpool.start(worker)
+
+    def cancel_search(self):
+        """Asks the running search worker, if any, to stop."""
+        if self.current_worker:
+            self.current_worker.cancel()
+            self._release_worker()
+            self.search_generation += 1
+
+    def _release_worker(self):
+        if self.app.current_search_worker is self.current_worker:
+            self.app.current_search_worker = None
+        self.current_worker = None
 
     def display_search_results(self, results):
         """Clears the list and displays all results returned from a search."""
         self.results_list.clear()
+        self.result_count = 0
+        self.append_search_results(results, self.search_generation)
         if not results:
             self.status_label.setText("No results found.")
-            return
 
+    def append_search_results(self, results, generation):
+        """Adds a batch of results streamed from the search worker, unless a newer search started."""
+        if generation != self.search_generation:
+            return
         for result_data in results:
-            item_text = f"{result_data['name']} (Line {result_data['line_num']})\n  {result_data['preview']}"
+            if result_data['line_num'] is None:
+                item_text = result_data['name']
+            else:
+                item_text = f"{result_data['name']} (Line {result_data['line_num']})\n  {result_data['preview']}"
             item = QListWidgetItem(item_text)
             item.setData(Qt.ItemDataRole.UserRole, result_data['path'])
             self.results_list.addItem(item)
-        
-        self.status_label.setText(f"Found {len(results)} match(es).")
+        self.result_count += len(results)
+        self.status_label.setText(f"Found {self.result_count} match(es).")
 
-    def search_finished(self):
+    def search_finished(self, generation):
         """Called when the search worker is done."""
+        if generation != self.search_generation:
+            return
+        self._release_worker()
         if self.results_list.count() == 0:
             self.status_label.setText("No results found.")
 
@@ -66,4 +144,6 @@ class SearchPopup(BasePopup):
         file_path = item.data(Qt.ItemDataRole.UserRole)
         if file_path:
             self.open_file_requested.emit(file_path)
+            if self.open_file_callback:
+                self.open_file_callback(file_path)
             self.accept()
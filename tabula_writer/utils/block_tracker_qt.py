@@ -0,0 +1,60 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class BlockTracker(QObject):
+    """
+    Keeps one computed value per block of a QTextDocument, such as the
+    footnotes or the word count of each line. On every contentsChange only
+    the blocks the edit touched are recomputed, so an edit costs time in
+    proportion to its span rather than to the document.
+
+    blocks_changed(first, old_values, new_values) reports that the values of
+    the blocks starting at block number `first` were replaced; the two lists
+    may differ in length when blocks were inserted or removed.
+    """
+    blocks_changed = pyqtSignal(int, list, list)
+
+    def __init__(self, document, compute, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self.compute = compute
+        self.values = []
+        self.reset()
+        document.contentsChange.connect(self._on_contents_change)
+
+    def reset(self):
+        """Recomputes every block, e.g. after the tracker missed changes."""
+        old_values = self.values
+        self.values = []
+        block = self.document.firstBlock()
+        while block.isValid():
+            self.values.append(self.compute(block.text()))
+            block = block.next()
+        self.blocks_changed.emit(0, old_values, list(self.values))
+
+    def _on_contents_change(self, position, chars_removed, chars_added):
+        document = self.document
+        first_block = document.findBlock(position)
+        if not first_block.isValid():
+            first_block = document.lastBlock()
+        last_block = document.findBlock(position + chars_added)
+        if not last_block.isValid():
+            last_block = document.lastBlock()
+        first, last = first_block.blockNumber(), last_block.blockNumber()
+
+        # The blocks first..last replaced first..old_last of the previous document
+        old_last = last - (document.blockCount() - len(self.values))
+        if old_last < first - 1 or old_last >= len(self.values):
+            self.reset()
+            return
+
+        new_values = []
+        block = first_block
+        while block.isValid() and block.blockNumber() <= last:
+            new_values.append(self.compute(block.text()))
+            block = block.next()
+        old_values = self.values[first:old_last + 1]
+        if old_values == new_values:
+            return
+        self.values[first:old_last + 1] = new_values
+        self.blocks_changed.emit(first, old_values, new_values)
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+
+# A directory modified this recently may change again within the same mtime tick,
+# so its listing is not trusted on the next scan (the same guard git uses for its index)
+RACY_SECONDS = 2.0
+
+
+class DirectoryScanner:
+    """
+    Scans a documents tree with os.scandir and remembers every directory's
+    mtime together with its listing. Creating, deleting or renaming an entry
+    updates the mtime of the directory holding it, so on later scans a
+    directory whose mtime is unchanged reuses its cached listing and the
+    cached signatures of its documents; only its subdirectories are stat'ed
+    to see whether anything deeper moved.
+
+    Editing a file in place does not touch its directory's mtime, so a quick
+    scan does not notice it; scan(full=True) re-stats every document.
+    """
+
+    def __init__(self, root, extension=".md"):
+        self.root = root
+        self.extension = extension
+        # directory -> {'mtime': ns or None, 'subdirectories': set, 'documents': {path: (mtime, size)}}
+        self.entries = {}
+        self.scanned = False
+        self._lock = threading.Lock()
+
+    def scan(self, full=False):
+        """
+        Brings the cache up to date and returns a dict with the full listing,
+        'directories' (directory -> set of subdirectories) and 'documents'
+        (path -> (mtime, size)), plus the delta since the previous scan:
+        'added', 'removed' and 'modified' document paths and the
+        'changed_directories' that had to be listed again. The delta lists
+        are empty on the first scan, which sets 'first_scan'.
+        """
+        with self._lock:
+            first_scan = not self.scanned
+            previous = self.entries
+            self.entries = {}
+            self._changed = []
+            self._full = full
+            self._now_ns = time.time_ns()
+            self._visit(self.root, previous)
+            self.scanned = True
+
+            result = {
+                'directories': {d: set(e['subdirectories']) for d, e in self.entries.items()},
+                'documents': {p: sig for e in self.entries.values() for p, sig in e['documents'].items()},
+                'changed_directories': sorted(self._changed),
+                'first_scan': first_scan,
+            }
+            result.update(self._delta(previous, result['documents']) if not first_scan
+                          else {'added': [], 'removed': [], 'modified': []})
+            return result
+
+    def _visit(self, directory, previous):
+        mtime = self._mtime(directory)
+        if mtime is None:
+            return
+        cached = previous.get(directory)
+        if cached is not None and cached['mtime'] is not None and cached['mtime'] == mtime:
+            entry = {'mtime': mtime, 'subdirectories': cached['subdirectories'],
+                     'documents': self._restat(cached['documents']) if self._full else cached['documents']}
+        else:
+            entry = self._list(directory, mtime)
+            if entry is None:
+                return
+            self._changed.append(directory)
+        self.entries[directory] = entry
+        for subdirectory in sorted(entry['subdirectories']):
+            self._visit(subdirectory, previous)
+        # A subdirectory that vanished between the listing and the visit is dropped from its parent
+        entry['subdirectories'] = {d for d in entry['subdirectories'] if d in self.entries}
+
+    def _list(self, directory, mtime):
+        subdirectories, documents = set(), {}
+        try:
+            with os.scandir(directory) as entries:
+                for item in entries:
+                    try:
+                        if item.is_dir():
+                            subdirectories.add(item.path)
+                        elif item.name.endswith(self.extension):
+                            stat = item.stat()
+                            documents[item.path] = (stat.st_mtime, stat.st_size)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        if self._now_ns - mtime < RACY_SECONDS * 1e9:
+            mtime = None
+        return {'mtime': mtime, 'subdirectories': subdirectories, 'documents': documents}
+
+    @staticmethod
+    def _mtime(directory):
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _restat(documents):
+        restated = {}
+        for path in documents:
+            try:
+                stat = os.stat(path)
+                restated[path] = (stat.st_mtime, stat.st_size)
+            except OSError:
+                continue
+        return restated
+
+    @staticmethod
+    def _delta(previous_entries, documents):
+        previous = {p: sig for e in previous_entries.values() for p, sig in e['documents'].items()}
+        return {
+            'added': sorted(p for p in documents if p not in previous),
+            'removed': sorted(p for p in previous if p not in documents),
+            'modified': sorted(p for p, sig in documents.items() if p in previous and previous[p] != sig),
+        }
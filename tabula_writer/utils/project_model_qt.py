@@ -0,0 +1,155 @@
+import os
+import re
+import datetime
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from .project_watcher_qt import ProjectWatcher
+
+GENERAL_NOTES_FILENAME = "_GeneralNotes.md"
+
+
+def sanitize_document_name(document_path):
+    """The folder and file prefix a document's comments are stored under."""
+    doc_base = os.path.splitext(os.path.basename(document_path))[0]
+    return re.sub(r'[^\w\-_\.]', '_', doc_base)
+
+
+def parse_comment(path, full_text):
+    """Turns a comment file into the dict the notes panel and exporter use, or None if it has no footnote."""
+    fn_match = re.search(r'\[\^(\d+)\]', full_text)
+    if not fn_match:
+        return None
+    body = "\n".join([line for line in full_text.split('\n') if not (line.startswith('#') or line.startswith('Referencing:') or line.startswith('Date:'))])
+    return {
+        'footnote_number': fn_match.group(1),
+        'body_text': body.strip(),
+        'full_text': full_text,
+        'path': path
+    }
+
+
+class ProjectModel(QObject):
+    """
+    The one place that knows what the project contains: its directories and
+    documents, the general notes file and the comments attached to each
+    document. It is populated by a single scan and then kept current by its
+    ProjectWatcher; panels, the search index and popups read from it and
+    subscribe to its signals rather than walking the project themselves.
+
+    documents_changed carries the changes dict ('added', 'removed',
+    'modified' document paths) since the last update, or None for the first
+    population. listing_changed is emitted just before it when a document or
+    directory was added or removed, so views of the tree can ignore edits.
+    comments_changed carries the document whose comments changed.
+    """
+    listing_changed = pyqtSignal()
+    documents_changed = pyqtSignal(object)
+    comments_changed = pyqtSignal(str)
+
+    def __init__(self, base_path, parent=None):
+        super().__init__(parent)
+        self.base_path = base_path
+        self.documents_path = os.path.join(base_path, "documents")
+        self.notes_path = os.path.join(base_path, "notes")
+        self.main_note_path = os.path.join(self.notes_path, GENERAL_NOTES_FILENAME)
+        os.makedirs(self.documents_path, exist_ok=True)
+        os.makedirs(self.notes_path, exist_ok=True)
+
+        self.directories = [self.documents_path]
+        self.documents = []
+        self.populated = False
+        self._document_set = set()
+        self._files_info = None
+        # document path -> (comments directory mtime, comment dicts)
+        self._comments = {}
+
+        self.watcher = ProjectWatcher(self.documents_path, self)
+        self.watcher.project_changed.connect(self.apply_scan)
+
+    def scan(self, full=False):
+        """Scans the documents tree; meant for a worker, whose result goes to apply_scan()."""
+        return self.watcher.scan(full=full)
+
+    def apply_scan(self, result):
+        directories, documents, changes = result
+        self.watcher.watch_tree()
+        # The watcher hands back the same lists while nothing was added or removed
+        listing_changed = not self.populated or directories is not self.directories or documents is not self.documents
+        if listing_changed:
+            self.directories, self.documents = directories, documents
+            self._document_set = set(documents)
+            self._files_info = None
+        self.populated = True
+        if listing_changed:
+            self.listing_changed.emit()
+        self.documents_changed.emit(changes)
+
+    def refresh(self, *directories):
+        """Picks up changes the app just made itself in the given directories."""
+        self.watcher.refresh(*directories)
+
+    def watch_document(self, path):
+        """Watches a document the writer opened, so edits made to it outside the app are noticed."""
+        self.watcher.watch_file(path)
+
+    def note_saved(self, path, content=None):
+        """Tells the watcher about a save made by the app, so it is not reported back as an outside edit."""
+        self.watcher.note_saved(path)
+
+    def contains(self, path):
+        return path in self._document_set
+
+    def files_info(self):
+        """Every searchable file as {'path', 'type', 'name'}: the documents, then the general notes."""
+        if self._files_info is None:
+            self._files_info = [{'path': p, 'type': 'document', 'name': os.path.splitext(os.path.basename(p))[0]} for p in self.documents]
+        files_info = list(self._files_info)
+        if os.path.exists(self.main_note_path):
+            files_info.append({'path': self.main_note_path, 'type': 'note', 'name': os.path.splitext(GENERAL_NOTES_FILENAME)[0]})
+        return files_info
+
+    def comments_dir(self, document_path):
+        return os.path.join(self.notes_path, 'comments', sanitize_document_name(document_path))
+
+    def comments_for(self, document_path):
+        """The comments attached to a document, sorted by file name. Re-read only when their folder changed."""
+        comments_dir = self.comments_dir(document_path)
+        try:
+            mtime = os.stat(comments_dir).st_mtime_ns
+        except OSError:
+            self._comments.pop(document_path, None)
+            return []
+        cached = self._comments.get(document_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        comments = []
+        for filename in sorted(os.listdir(comments_dir)):
+            if filename.endswith(".md"):
+                path = os.path.join(comments_dir, filename)
+                with open(path, 'r', encoding='utf-8') as f: full_text = f.read()
+                comment = parse_comment(path, full_text)
+                if comment:
+                    comments.append(comment)
+        self._comments[document_path] = (mtime, comments)
+        return comments
+
+    def save_comment(self, document_path, footnote_number, comment_text):
+        sanitized_doc = sanitize_document_name(document_path)
+        comments_dir = self.comments_dir(document_path)
+        os.makedirs(comments_dir, exist_ok=True)
+        comment_path = os.path.join(comments_dir, f"{sanitized_doc}_comment_{footnote_number}.md")
+        content = f"# Comment for [^{footnote_number}]\nReferencing: '{os.path.basename(document_path)}'\nDate: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n{comment_text.strip()}\n"
+        with open(comment_path, "w", encoding="utf-8") as f: f.write(content)
+        # Rewriting an existing comment does not touch the folder's mtime
+        self._comments.pop(document_path, None)
+        self.comments_changed.emit(document_path)
+
+    def delete_comments(self, document_path, footnote_numbers):
+        sanitized_doc = sanitize_document_name(document_path)
+        comments_dir = self.comments_dir(document_path)
+        for num in footnote_numbers:
+            path = os.path.join(comments_dir, f"{sanitized_doc}_comment_{num}.md")
+            if os.path.exists(path): os.remove(path)
+        self._comments.pop(document_path, None)
+        self.comments_changed.emit(document_path)
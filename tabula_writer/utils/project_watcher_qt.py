@@ -0,0 +1,245 @@
+import os
+import threading
+from collections import OrderedDict
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from .directory_scanner import DirectoryScanner
+
+# Directory events tend to come in bursts (a git pull, a sync run), so they are gathered first
+EVENT_DEBOUNCE_MS = 200
+# Documents watched individually: the open one and those changed most recently
+MAX_WATCHED_FILES = 64
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime, stat.st_size)
+    except OSError:
+        return None
+
+
+class ProjectWatcher(QObject):
+    """
+    Keeps an in-memory picture of the documents tree: every directory and,
+    per directory, the (mtime, size) signature of each .md document. scan()
+    builds it through a DirectoryScanner, which only lists directories whose
+    mtime moved since the last scan, and from then on QFileSystemWatcher
+    events keep it current by re-listing only the directories that changed.
+
+    Directory watches do not fire when a document is edited in place, so the
+    open document and the most recently changed ones are also watched as
+    files (see watch_file()); anything else edited in place is picked up by
+    a scan(full=True).
+
+    project_changed carries the same (directories, documents, changes) tuple
+    that scan() returns, with changes a dict of 'added', 'removed' and
+    'modified' document paths. The two lists are the same objects as long as
+    no document or directory was added or removed.
+    """
+    project_changed = pyqtSignal(object)
+
+    def __init__(self, documents_path, parent=None):
+        super().__init__(parent)
+        self.documents_path = documents_path
+        self.scanner = DirectoryScanner(documents_path)
+        # directory -> set of its subdirectories, for every directory in the tree
+        self.tree = {}
+        # directory -> {document path: (mtime, size)}; None until the first scan
+        self.documents = None
+        self._listing_cache = None
+        # scan() runs on a worker while events are handled on the GUI thread
+        self._lock = threading.Lock()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        self.watched_files = OrderedDict()
+        # Set by scan(); the next watch_tree() then compares every watched directory
+        self.watches_stale = True
+        self.pending_directories = set()
+        self.pending_files = set()
+        self.event_timer = QTimer(self)
+        self.event_timer.setSingleShot(True)
+        self.event_timer.setInterval(EVENT_DEBOUNCE_MS)
+        self.event_timer.timeout.connect(self._process_pending)
+
+    def scan(self, full=False):
+        """
+        Brings the picture up to date with the disk. Returns (directories,
+        documents, changes), where changes is None for the very first scan.
+        Only changed directories are listed unless full is set, which also
+        re-stats every document to catch edits made in place. Safe to run on
+        a worker; call watch_tree() on the GUI thread afterwards.
+        """
+        result = self.scanner.scan(full=full)
+        documents = {directory: {} for directory in result['directories']}
+        for path, signature in result['documents'].items():
+            documents.setdefault(os.path.dirname(path), {})[path] = signature
+
+        with self._lock:
+            previous, previous_tree = self.documents, self.tree
+            self.tree, self.documents = result['directories'], documents
+            self.watches_stale = True
+            if previous is None:
+                self._listing_cache = None
+                return self._listing() + (None,)
+            changes = {'added': [], 'removed': [], 'modified': []}
+            for directory in previous.keys() | documents.keys():
+                self._diff(changes, previous.get(directory, {}), documents.get(directory, {}))
+            if changes['added'] or changes['removed'] or previous_tree.keys() != self.tree.keys():
+                self._listing_cache = None
+            return self._listing() + (changes,)
+
+    def watch_tree(self):
+        """After a scan, points the file system watcher at exactly the directories in the tree."""
+        if not self.watches_stale:
+            return
+        with self._lock:
+            wanted = set(self.tree)
+            self.watches_stale = False
+        watched = set(self.watcher.directories())
+        if watched - wanted:
+            self.watcher.removePaths(list(watched - wanted))
+        self._add_directory_watches(wanted - watched)
+
+    def watch_file(self, path):
+        """Watches a document for edits in place; the least recently watched one is let go past MAX_WATCHED_FILES."""
+        if path in self.watched_files:
+            self.watched_files.move_to_end(path)
+            return
+        if not self.watcher.addPath(path):
+            return
+        self.watched_files[path] = True
+        while len(self.watched_files) > MAX_WATCHED_FILES:
+            oldest, _ = self.watched_files.popitem(last=False)
+            self.watcher.removePath(oldest)
+
+    def note_saved(self, path):
+        """Records a document the app just wrote itself, so its own save is not reported as an outside change."""
+        with self._lock:
+            if self.documents is None:
+                return
+            directory_documents = self.documents.get(os.path.dirname(path))
+            if directory_documents is not None and path in directory_documents:
+                directory_documents[path] = file_signature(path)
+
+    def refresh(self, *directories):
+        """Re-lists the given directories soon, e.g. right after the app changed them itself."""
+        self.pending_directories.update(directories)
+        self.event_timer.start()
+
+    def _on_directory_changed(self, path):
+        self.pending_directories.add(path)
+        if not self.event_timer.isActive():
+            self.event_timer.start()
+
+    def _on_file_changed(self, path):
+        self.pending_files.add(path)
+        if not self.event_timer.isActive():
+            self.event_timer.start()
+
+    def _process_pending(self):
+        directories, self.pending_directories = self.pending_directories, set()
+        files, self.pending_files = self.pending_files, set()
+        changes = {'added': [], 'removed': [], 'modified': []}
+        self._new_directories, self._gone_directories = set(), set()
+        with self._lock:
+            if self.documents is None:
+                return
+            for directory in sorted(directories):
+                self._rescan_directory(directory, changes)
+            for path in files - set(changes['added']) - set(changes['removed']):
+                self._restat_file(path, changes)
+            tree_changed = bool(self._new_directories or self._gone_directories)
+            if tree_changed or changes['added'] or changes['removed']:
+                self._listing_cache = None
+            result = self._listing() + (changes,)
+
+        if self._gone_directories:
+            self.watcher.removePaths(list(self._gone_directories))
+        self._add_directory_watches(self._new_directories)
+        for path in files:
+            # Editors that save by replacing the file end its watch; pick it up again
+            if path in self.watched_files and path not in self.watcher.files() and os.path.exists(path):
+                self.watcher.addPath(path)
+        for path in changes['added'] + changes['modified']:
+            self.watch_file(path)
+        if tree_changed or any(changes.values()):
+            self.project_changed.emit(result)
+
+    def _rescan_directory(self, directory, changes):
+        """Re-lists one directory, scanning new subdirectories and dropping vanished ones. Lock held."""
+        if directory not in self.tree:
+            parent = os.path.dirname(directory)
+            if parent in self.tree and os.path.isdir(directory):
+                self._rescan_directory(parent, changes)
+            return
+        if not os.path.isdir(directory):
+            self._drop_subtree(directory, changes)
+            return
+
+        subdirectories, documents = set(), {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirectories.add(entry.path)
+                    elif entry.name.endswith(".md"):
+                        documents[entry.path] = file_signature(entry.path)
+        except OSError:
+            self._drop_subtree(directory, changes)
+            return
+
+        self._diff(changes, self.documents.get(directory, {}), documents)
+        self.documents[directory] = documents
+
+        for gone in self.tree[directory] - subdirectories:
+            self._drop_subtree(gone, changes)
+        new_subdirectories = subdirectories - self.tree[directory]
+        self.tree[directory] = subdirectories
+        for subdirectory in new_subdirectories:
+            self.tree[subdirectory] = set()
+            self.documents[subdirectory] = {}
+            self._new_directories.add(subdirectory)
+            self._rescan_directory(subdirectory, changes)
+
+    def _restat_file(self, path, changes):
+        """Compares one watched document with its recorded signature. Lock held."""
+        directory_documents = self.documents.get(os.path.dirname(path))
+        if directory_documents is None or path not in directory_documents:
+            return
+        signature = file_signature(path)
+        if signature is not None and signature != directory_documents[path]:
+            directory_documents[path] = signature
+            changes['modified'].append(path)
+
+    def _drop_subtree(self, directory, changes):
+        for subdirectory in self.tree.pop(directory, ()):
+            self._drop_subtree(subdirectory, changes)
+        changes['removed'].extend(self.documents.pop(directory, {}))
+        self._new_directories.discard(directory)
+        self._gone_directories.add(directory)
+        parent = os.path.dirname(directory)
+        if parent in self.tree:
+            self.tree[parent].discard(directory)
+
+    def _add_directory_watches(self, directories):
+        if directories:
+            failed = self.watcher.addPaths(sorted(directories))
+            if failed:
+                print(f"Could not watch {len(failed)} directories; use Refresh to pick up their changes.")
+
+    def _listing(self):
+        """The sorted directory and document lists, rebuilt only after something was added or removed."""
+        if self._listing_cache is None:
+            directories = [self.documents_path] + sorted(d for d in self.tree if d != self.documents_path)
+            documents = sorted(path for directory_documents in self.documents.values() for path in directory_documents)
+            self._listing_cache = (directories, documents)
+        return self._listing_cache
+
+    @staticmethod
+    def _diff(changes, previous, current):
+        changes['added'].extend(p for p in current if p not in previous)
+        changes['removed'].extend(p for p in previous if p not in current)
+        changes['modified'].extend(p for p, sig in current.items() if p in previous and previous[p] != sig)
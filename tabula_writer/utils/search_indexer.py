@@ -1,81 +1,982 @@
 import re
 import os
+import sys
+import math
+import heapq
+import hashlib
+import marshal
+import zlib
+import threading
+from array import array
+from bisect import bisect_left, insort
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+WIKILINK_PATTERN = re.compile(r'\[\[(.*?)\]\]')
+TAG_PATTERN = re.compile(r'(@\w+)')
+TERM_PATTERN = re.compile(r'\w+')
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+# Bump whenever the parsed record layout changes, so stale cache files are ignored.
+CACHE_VERSION = 5
+CACHE_FILENAME = ".search_index.bin"
+# Below this many files a process pool costs more to start than it saves.
+PARALLEL_MIN_FILES = 400
+PARALLEL_CHUNK_SIZE = 200
+# Standard Okapi BM25 parameters: term-frequency saturation and length normalisation.
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Vocabularies with trigram lookup: full-text terms and wikilink targets.
+TRIGRAM_KINDS = ('terms', 'wikilinks')
+# Caps how many vocabulary entries one prefix, substring or fuzzy word expands to.
+MAX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    """Returns the lowercased search terms of a piece of text."""
+    return [term.lower() for term in TERM_PATTERN.findall(text)]
+
+
+class FileRecord:
+    """
+    Everything the index holds for one file: its stats, the keys it contributes
+    and its term positions. Positions are packed into one flat array of
+    (line_num, offset, ordinal) triples grouped by term, so a record pickles
+    cheaply between indexing processes and costs a handful of objects per file.
+    Records loaded from the cache keep their terms, counts and positions as the
+    compressed blob they were saved as until something reads them, and keep
+    the blob so later saves need not pack them again.
+    """
+    __slots__ = ('stats', 'wikilinks', 'link_forms', 'tags', 'length',
+                 '_terms', '_counts', '_positions', '_packed', '_slots')
+
+    def __init__(self, wikilinks, tags, terms, counts, positions, stats=None, link_forms=None):
+        # Keys are tuples of interned strings shared with the index, not per-file sets
+        self.stats = stats
+        self.wikilinks = wikilinks
+        # Each wikilink as first written in the file, in the order of wikilinks
+        self.link_forms = link_forms if link_forms is not None else wikilinks
+        self.tags = tags
+        # Number of terms in the file, as used for BM25 length normalisation
+        self.length = len(positions) // 3 if positions is not None else 0
+        self._terms = terms
+        self._counts = counts
+        self._positions = positions
+        self._packed = None
+        self._slots = None
+
+    @classmethod
+    def from_packed(cls, packed, length, wikilinks, tags, stats, link_forms):
+        """Makes a record whose postings stay in the blob returned by pack until first used."""
+        record = cls(wikilinks, tags, None, None, None, stats=stats, link_forms=link_forms)
+        record.length = length
+        record._packed = packed
+        return record
+
+    def pack(self):
+        """Returns the terms, counts and positions as one compressed, marshalled blob."""
+        if self._packed is None:
+            self._packed = zlib.compress(marshal.dumps(
+                (self._terms, self._counts.tobytes(), self._positions.tobytes())), 1)
+        return self._packed
+
+    def _unpack(self):
+        terms, counts, positions = marshal.loads(zlib.decompress(self._packed))
+        self._terms = tuple(map(sys.intern, terms))
+        self._counts = array('I')
+        self._counts.frombytes(counts)
+        self._positions = array('I')
+        self._positions.frombytes(positions)
+
+    @property
+    def terms(self):
+        if self._terms is None:
+            self._unpack()
+        return self._terms
+
+    @terms.setter
+    def terms(self, terms):
+        self._terms = terms
+
+    @property
+    def counts(self):
+        if self._terms is None:
+            self._unpack()
+        return self._counts
+
+    @property
+    def positions(self):
+        if self._terms is None:
+            self._unpack()
+        return self._positions
+
+    def positions_of(self, term):
+        """Returns the flat (line_num, offset, ordinal) triples of a term in this file."""
+        if self._slots is None:
+            slots, start = {}, 0
+            for known_term, count in zip(self.terms, self.counts):
+                slots[known_term] = (start, count)
+                start += count
+            self._slots = slots
+        start, count = self._slots.get(term, (0, 0))
+        return self.positions[start * 3:(start + count) * 3]
+
+
+def parse_content(content):
+    """
+    Extracts the wikilinks, tags and positional term postings from a document.
+    The ordinal of a posting is the position of the term within the whole
+    document, which is what phrase matching compares.
+    """
+    link_forms = {}
+    for link in WIKILINK_PATTERN.findall(content):
+        link_forms.setdefault(sys.intern(link.lower()), link)
+    wikilinks = tuple(link_forms)
+    tags = tuple({sys.intern(tag.lower()) for tag in TAG_PATTERN.findall(content)})
+
+    postings = {}
+    ordinal = 0
+    for line_num, line in enumerate(content.split('\n'), start=1):
+        for match in TERM_PATTERN.finditer(line):
+            postings.setdefault(match.group().lower(), []).append((line_num, match.start(), ordinal))
+            ordinal += 1
+
+    terms = tuple(sys.intern(term) for term in postings)
+    counts = array('I', [len(postings[term]) for term in terms])
+    positions = array('I', [value for term in terms for posting in postings[term] for value in posting])
+    return FileRecord(wikilinks, tags, terms, counts, positions, link_forms=tuple(link_forms.values()))
+
+
+def content_digest(data):
+    """Hashes raw file bytes so touched-but-unchanged files are not re-parsed."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def parse_file(path):
+    """Reads and parses one file into a FileRecord, or returns None if it cannot be read."""
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        record = parse_content(data.decode('utf-8'))
+    except (IOError, UnicodeDecodeError):
+        return None
+    record.stats = (stat.st_mtime, stat.st_size, content_digest(data))
+    return record
+
+
+def parse_files_chunk(first_id, paths):
+    """
+    Parses a chunk of files, possibly in a worker process. The files get the
+    document ids first_id, first_id + 1, ... in order. Returns their records
+    and the chunk's partial postings (key -> ascending doc ids), so the parent
+    merges whole key buckets instead of individual postings.
+    """
+    records = []
+    partial = {'wikilinks': {}, 'tags': {}, 'terms': {}}
+    for doc_id, path in enumerate(paths, start=first_id):
+        record = parse_file(path)
+        records.append(record)
+        if record is not None:
+            _add_keys(partial, doc_id, record, ascending=True)
+    return records, partial
+
+
+def trigrams(text, anchored=True):
+    """
+    Returns the trigrams of a string. Anchored trigrams include the '$' start
+    and end markers, so prefixes and whole words can be told apart from
+    substrings.
+    """
+    if anchored:
+        text = f"${text}$"
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def intersect_sorted(a, b):
+    """
+    Intersects two ascending doc id arrays. Walks the shorter one and gallops
+    through the longer one with bisect, so a rare key against a common one
+    costs little more than the rare key's length.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    result = array('I')
+    lo, end = 0, len(b)
+    for doc_id in a:
+        lo = bisect_left(b, doc_id, lo)
+        if lo == end:
+            break
+        if b[lo] == doc_id:
+            result.append(doc_id)
+            lo += 1
+    return result
+
+
+def union_sorted(arrays):
+    """Merges ascending doc id arrays into one ascending array without duplicates."""
+    if len(arrays) == 1:
+        return arrays[0]
+    result = array('I')
+    last = None
+    for doc_id in heapq.merge(*arrays):
+        if doc_id != last:
+            result.append(doc_id)
+            last = doc_id
+    return result
+
+
+def difference_sorted(a, b):
+    """Returns the ids of ascending array a that are not in ascending array b."""
+    result = array('I')
+    lo, end = 0, len(b)
+    for doc_id in a:
+        lo = bisect_left(b, doc_id, lo)
+        if lo == end or b[lo] != doc_id:
+            result.append(doc_id)
+    return result
+
+
+def _never_cancelled():
+    return False
+
+
+def _add_keys(index, doc_id, record, ascending=False):
+    """
+    Adds a file's wikilinks, tags and terms to the key -> doc id postings of an
+    index. Pass ascending=True when ids are handed out in increasing order, so
+    they can be appended instead of inserted in place.
+    """
+    for kind, keys in (('wikilinks', record.wikilinks), ('tags', record.tags), ('terms', record.terms)):
+        bucket_map = index[kind]
+        for key in keys:
+            bucket = bucket_map.get(key)
+            if bucket is None:
+                bucket_map[key] = array('I', (doc_id,))
+            elif ascending:
+                bucket.append(doc_id)
+            else:
+                insort(bucket, doc_id)
+
 
 class SearchIndexer:
-    def __init__(self):
-        self.index = {'wikilinks': {}, 'tags': {}}
+    def __init__(self, cache_path=None):
+        # key -> ascending array of doc ids, for wikilinks, tags and full-text terms alike
+        self.index = {'wikilinks': {}, 'tags': {}, 'terms': {}}
         self.all_paths = set()
+        # Documents are numbered so postings hold small ints instead of repeated path strings.
+        # doc_paths and doc_records are indexed by doc id; freed ids are reused.
+        self.doc_ids = {}
+        self.doc_paths = []
+        self.doc_records = []
+        self._free_ids = []
+        # Sum of all record lengths, kept up to date for BM25's average document length
+        self.total_length = 0
+        # trigram -> set of keys, over the term and wikilink vocabularies; None until first needed
+        self.trigrams = None
+        self.cache_path = cache_path
+        self._cache_loaded = False
+        self._dirty = False
+        # Guards the index against queries from the GUI thread while a worker updates it.
+        self._lock = threading.RLock()
+        # Serialises cache saves, which several workers may make at once
+        self._save_lock = threading.Lock()
+        # One path -> record (None once removed) map per build or load in flight, see _record_updates
+        self._pending_updates = []
 
-    def build_index(self, files_info):
-        """Builds the entire index from a list of all project files."""
-        # Reset the index completely on a full rebuild
-        self.index = {'wikilinks': {}, 'tags': {}}
-        self.all_paths.clear()
+    def build_index(self, files_info, processes=None):
+        """
+        Builds the entire index from a list of all project files. Large projects
+        are split into chunks that a pool of processes parses in parallel; the
+        partial results are merged here. processes=1 forces a serial build.
+        """
+        paths = [file_info['path'] for file_info in files_info]
+        updates = self._record_updates()
+        try:
+            index, doc_records = self._build_maps(paths, processes or os.cpu_count() or 1)
+            doc_paths = [path if record is not None else None for path, record in zip(paths, doc_records)]
+            with self._lock:
+                self.index = index
+                self.all_paths = set(paths)
+                self._set_documents(doc_paths, doc_records)
+                self._replay_updates(updates)
+                self._cache_loaded = True
+                self._dirty = True
+        finally:
+            self._stop_recording(updates)
 
-        wikilink_pattern = re.compile(r'\[\[(.*?)\]\]')
-        tag_pattern = re.compile(r'(@\w+)')
+    def _build_maps(self, paths, processes):
+        """Parses the files and returns their postings and records, with doc ids in the order of paths."""
+        chunk_results = None
+        if processes > 1 and len(paths) >= PARALLEL_MIN_FILES:
+            chunk_results = self._parse_in_parallel(paths, processes)
+        if chunk_results is None:
+            chunk_results = [parse_files_chunk(0, paths)]
 
-        for file_info in files_info:
-            path = file_info['path']
-            self.all_paths.add(path)
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                found_wikilinks = set(wikilink_pattern.findall(content))
-                for link in found_wikilinks:
-                    link_key = link.lower()
-                    if link_key not in self.index['wikilinks']:
-                        self.index['wikilinks'][link_key] = set()
-                    self.index['wikilinks'][link_key].add(path)
-
-                found_tags = set(tag_pattern.findall(content))
-                for tag in found_tags:
-                    tag_key = tag.lower()
-                    if tag_key not in self.index['tags']:
-                        self.index['tags'][tag_key] = set()
-                    self.index['tags'][tag_key].add(path)
-            except (IOError, UnicodeDecodeError):
-                continue
+        # Build into fresh maps and swap them in, so searches never see a half-built index.
+        # Doc ids follow the order of paths, and chunks come back in order, so every
+        # bucket stays sorted by simply extending it.
+        index = {'wikilinks': {}, 'tags': {}, 'terms': {}}
+        doc_records = []
+        for records, partial in chunk_results:
+            for record in records:
+                if record is not None:
+                    self._intern_record(record)
+                doc_records.append(record)
+            for kind, partial_map in partial.items():
+                bucket_map = index[kind]
+                for key, chunk_ids in partial_map.items():
+                    key = sys.intern(key)
+                    bucket = bucket_map.get(key)
+                    if bucket is None:
+                        bucket_map[key] = chunk_ids
+                    else:
+                        bucket.extend(chunk_ids)
+        return index, doc_records
+
+    def _record_updates(self):
+        """
+        Starts collecting the files updated or removed while a new index is
+        built outside the lock. Those edits land in the maps about to be
+        replaced, so they are replayed onto the new ones once installed.
+        """
+        updates = {}
+        with self._lock:
+            self._pending_updates.append(updates)
+        return updates
+
+    def _stop_recording(self, updates):
+        with self._lock:
+            self._pending_updates = [pending for pending in self._pending_updates if pending is not updates]
+
+    def _replay_updates(self, updates):
+        """Re-applies the updates collected since _record_updates. Callers must hold the lock."""
+        self._stop_recording(updates)
+        for path, record in updates.items():
+            if record is None:
+                self._clear_file_from_index(path)
+            else:
+                self._replace_file(path, record)
+        if updates:
+            self._dirty = True
+
+    @staticmethod
+    def _intern_record(record):
+        """Re-interns the keys of a record unpickled from a worker process."""
+        record.terms = tuple(map(sys.intern, record.terms))
+        record.wikilinks = tuple(map(sys.intern, record.wikilinks))
+        record.tags = tuple(map(sys.intern, record.tags))
+
+    def _set_documents(self, doc_paths, doc_records):
+        """Installs a complete doc id table. Callers must hold the lock and have set self.index."""
+        self.doc_paths = doc_paths
+        self.doc_records = doc_records
+        self.doc_ids = {path: doc_id for doc_id, path in enumerate(doc_paths) if path is not None}
+        self._free_ids = [doc_id for doc_id, path in enumerate(doc_paths) if path is None]
+        self.total_length = sum(record.length for record in doc_records if record is not None)
+        # Built again by the first prefix, substring or fuzzy lookup
+        self.trigrams = None
+
+    @staticmethod
+    def _parse_in_parallel(paths, processes):
+        """Parses files across a process pool. Returns None if the pool cannot be used."""
+        starts = range(0, len(paths), PARALLEL_CHUNK_SIZE)
+        chunks = [paths[i:i + PARALLEL_CHUNK_SIZE] for i in starts]
+        # Spawned workers only import this module, so they never inherit the GUI's threads
+        context = multiprocessing.get_context('spawn')
+        try:
+            with ProcessPoolExecutor(max_workers=min(processes, len(chunks)), mp_context=context) as pool:
+                return list(pool.map(parse_files_chunk, starts, chunks))
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Parallel indexing unavailable, falling back to a serial build: {e}")
+            return None
+
+    def sync_index(self, files_info):
+        """
+        Brings the index up to date with the given project files, starting from
+        the on-disk cache when there is one. Files whose mtime and size match the
+        cached record are not opened; files that were touched but whose content
+        hash is unchanged are not re-parsed. Returns the number of files re-read.
+        """
+        if not self._cache_loaded and not self.load_cache():
+            # Cold start: nothing to validate against, so take the (parallel) full build
+            self.build_index(files_info)
+            self.save_cache()
+            return len(files_info)
+
+        wanted = {file_info['path'] for file_info in files_info}
+        with self._lock:
+            stale = self.all_paths - wanted
+            for path in stale:
+                self._clear_file_from_index(path)
+            if stale:
+                self._dirty = True
+
+        reread = 0
+        for path in wanted:
+            if self._refresh_file(path):
+                reread += 1
+
+        self.save_cache()
+        return reread
+
+    def apply_changes(self, changed_paths, removed_paths):
+        """
+        Applies a rescan diff to the index. Changed files are re-read only if
+        their stats differ from what the index holds, so files the editor just
+        saved through update_file are not parsed twice. Returns the number of
+        files re-read.
+        """
+        for path in removed_paths:
+            self.remove_file(path)
+        return sum(1 for path in changed_paths if self._refresh_file(path))
+
+    def rebuild_index(self, files_info):
+        """Discards the current index, rebuilds it from scratch and saves it."""
+        self.build_index(files_info)
+        self.save_cache()
+
+    def get_record(self, path):
+        """Returns the FileRecord indexed for a path, or None."""
+        with self._lock:
+            doc_id = self.doc_ids.get(path)
+            return self.doc_records[doc_id] if doc_id is not None else None
+
+    def _refresh_file(self, path):
+        """Re-indexes a file from disk unless its stored stats show it is unchanged."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.remove_file(path)
+            return False
+
+        record = self.get_record(path)
+        known = record.stats if record else None
+        if known and known[:2] == (stat.st_mtime, stat.st_size):
+            return False
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return False
+        digest = content_digest(data)
+
+        with self._lock:
+            if known and known[2] == digest and self.get_record(path) is record:
+                record.stats = (stat.st_mtime, stat.st_size, digest)
+                self._dirty = True
+                return True
+
+        try:
+            record = parse_content(data.decode('utf-8'))
+        except UnicodeDecodeError:
+            with self._lock:
+                self._clear_file_from_index(path)
+                self.all_paths.add(path)
+            return True
+
+        record.stats = (stat.st_mtime, stat.st_size, digest)
+        with self._lock:
+            self._replace_file(path, record)
+        return True
+
+    def _replace_file(self, path, record):
+        """Swaps a file's entries for a freshly parsed record. Callers must hold the lock."""
+        for updates in self._pending_updates:
+            updates[path] = record
+        self._clear_file_from_index(path)
+        self.all_paths.add(path)
+
+        if self._free_ids:
+            doc_id = self._free_ids.pop()
+            self.doc_paths[doc_id] = path
+            self.doc_records[doc_id] = record
+        else:
+            doc_id = len(self.doc_paths)
+            self.doc_paths.append(path)
+            self.doc_records.append(record)
+        self.doc_ids[path] = doc_id
+        self.total_length += record.length
+
+        if self.trigrams is None:
+            _add_keys(self.index, doc_id, record)
+        else:
+            new_keys = {kind: [key for key in getattr(record, kind) if key not in self.index[kind]]
+                        for kind in TRIGRAM_KINDS}
+            _add_keys(self.index, doc_id, record)
+            for kind, keys in new_keys.items():
+                for key in keys:
+                    self._add_trigrams(kind, key)
+        self._dirty = True
+
+    def _trigram_map(self, kind):
+        """Returns the trigram map of a vocabulary, building the maps on first use. Callers must hold the lock."""
+        if self.trigrams is None:
+            self._rebuild_trigrams()
+        return self.trigrams[kind]
+
+    def _add_trigrams(self, kind, key):
+        gram_map = self.trigrams[kind]
+        for gram in trigrams(key):
+            gram_map.setdefault(gram, set()).add(key)
+
+    def _remove_trigrams(self, kind, key):
+        gram_map = self.trigrams[kind]
+        for gram in trigrams(key):
+            keys = gram_map.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del gram_map[gram]
+
+    def _rebuild_trigrams(self):
+        """Computes the trigram maps from the current vocabularies. Callers must hold the lock."""
+        self.trigrams = {kind: {} for kind in TRIGRAM_KINDS}
+        for kind in TRIGRAM_KINDS:
+            for key in self.index[kind]:
+                self._add_trigrams(kind, key)
 
     def _clear_file_from_index(self, path):
-        """Removes all references to a given file path from the index."""
+        """Removes all references to a given file path from the index, pruning emptied keys."""
         self.all_paths.discard(path)
-        for link_key, paths in self.index['wikilinks'].items():
-            paths.discard(path)
-        for tag_key, paths in self.index['tags'].items():
-            paths.discard(path)
+        doc_id = self.doc_ids.pop(path, None)
+        if doc_id is None:
+            return
+        record = self.doc_records[doc_id]
+        self.doc_paths[doc_id] = None
+        self.doc_records[doc_id] = None
+        self._free_ids.append(doc_id)
+        self.total_length -= record.length
+
+        for kind, keys in (('wikilinks', record.wikilinks), ('tags', record.tags), ('terms', record.terms)):
+            bucket_map = self.index[kind]
+            for key in keys:
+                bucket = bucket_map.get(key)
+                if bucket is None:
+                    continue
+                i = bisect_left(bucket, doc_id)
+                if i < len(bucket) and bucket[i] == doc_id:
+                    del bucket[i]
+                if not bucket:
+                    del bucket_map[key]
+                    if self.trigrams is not None and kind in self.trigrams:
+                        self._remove_trigrams(kind, key)
 
     def update_file(self, path, content):
         """Updates the index for a single file given its path and content."""
-        self._clear_file_from_index(path)
-        self.all_paths.add(path)
-        
-        wikilink_pattern = re.compile(r'\[\[(.*?)\]\]')
-        tag_pattern = re.compile(r'(@\w+)')
-
-        found_wikilinks = set(wikilink_pattern.findall(content))
-        for link in found_wikilinks:
-            link_key = link.lower()
-            if link_key not in self.index['wikilinks']:
-                self.index['wikilinks'][link_key] = set()
-            self.index['wikilinks'][link_key].add(path)
-
-        found_tags = set(tag_pattern.findall(content))
-        for tag in found_tags:
-            tag_key = tag.lower()
-            if tag_key not in self.index['tags']:
-                self.index['tags'][tag_key] = set()
-            self.index['tags'][tag_key].add(path)
+        record = parse_content(content)
+        # The content was just written to disk, so its stats validate the entry on the next startup
+        try:
+            stat = os.stat(path)
+            record.stats = (stat.st_mtime, stat.st_size, content_digest(content.encode('utf-8')))
+        except OSError:
+            pass
+        with self._lock:
+            self._replace_file(path, record)
+
+    def remove_file(self, path):
+        """Drops a deleted or renamed file from the index."""
+        with self._lock:
+            for updates in self._pending_updates:
+                updates[path] = None
+            if path in self.all_paths:
+                self._clear_file_from_index(path)
+                self._dirty = True
+
+    def load_cache(self):
+        """
+        Loads the index saved by save_cache. Postings come back as whole
+        buckets and each file's positions stay packed until a search reads
+        them, so loading costs about one object per key and file rather than
+        per word. A missing or unreadable cache leaves the index empty.
+        """
+        self._cache_loaded = True
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        updates = self._record_updates()
+        try:
+            loaded = self._read_cache()
+            if loaded is None:
+                return False
+            doc_paths, doc_records, index = loaded
+            with self._lock:
+                self.index = index
+                self.all_paths = {path for path in doc_paths if path is not None}
+                self._set_documents(doc_paths, doc_records)
+                self._dirty = False
+                self._replay_updates(updates)
+            return True
+        finally:
+            self._stop_recording(updates)
+
+    def _read_cache(self):
+        """Reads the cache file into doc paths, records and postings, or returns None if it is unusable."""
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION \
+                or data.get('byteorder') != sys.byteorder:
+            return None
+
+        index = {}
+        for kind, (keys, lengths_blob, ids_blob) in data['index'].items():
+            lengths = array('I')
+            lengths.frombytes(lengths_blob)
+            ids = array('I')
+            ids.frombytes(ids_blob)
+            bucket_map = index[kind] = {}
+            start = 0
+            for key, length in zip(keys, lengths):
+                bucket_map[key] = ids[start:start + length]
+                start += length
+
+        doc_paths = list(data['paths'])
+        doc_records = [FileRecord.from_packed(*entry) if entry is not None else None for entry in data['files']]
+        return doc_paths, doc_records, index
+
+    def save_cache(self):
+        """
+        Writes the index to the cache file if it changed since the last save.
+        Buckets and positions are written as raw array bytes, and records
+        still packed from the last load are written back as they are.
+        """
+        if not self.cache_path:
+            return False
+        # Held from the snapshot to the rename, so saves neither share the temp file nor land out of order
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                files = [(record.pack(), record.length, record.wikilinks, record.tags,
+                          record.stats, record.link_forms) if record is not None else None
+                         for record in self.doc_records]
+                index = {}
+                for kind, bucket_map in self.index.items():
+                    ids = array('I')
+                    for bucket in bucket_map.values():
+                        ids.extend(bucket)
+                    lengths = array('I', map(len, bucket_map.values()))
+                    index[kind] = (tuple(bucket_map), lengths.tobytes(), ids.tobytes())
+                data = {'version': CACHE_VERSION, 'byteorder': sys.byteorder,
+                        'paths': tuple(self.doc_paths), 'files': files, 'index': index}
+                self._dirty = False
+
+            tmp_path = self.cache_path + ".tmp"
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    marshal.dump(data, f)
+                os.replace(tmp_path, self.cache_path)
+            except IOError as e:
+                print(f"Error saving search index: {e}")
+                return False
+            return True
+
+    def paths_for(self, doc_ids):
+        """Maps doc ids back to file paths."""
+        with self._lock:
+            return [self.doc_paths[doc_id] for doc_id in doc_ids]
 
     def get_occurrences_for_wikilink(self, link_text):
         """Gets all file paths containing a given wikilink."""
-        return list(self.index['wikilinks'].get(link_text.lower(), []))
+        with self._lock:
+            return self.paths_for(self.index['wikilinks'].get(link_text.lower(), ()))
 
     def get_files_for_tag(self, tag_text):
         """Gets all file paths containing a given tag."""
-        return list(self.index['tags'].get(tag_text.lower(), []))
+        with self._lock:
+            return self.paths_for(self.index['tags'].get(tag_text.lower(), ()))
 
     def get_all_indexed_paths(self):
         """Returns a list of all file paths currently in the index."""
-        return list(self.all_paths)
+        with self._lock:
+            return list(self.all_paths)
+
+    def _parse_query(self, query, is_cancelled=_never_cancelled):
+        """
+        Splits a query into phrases, each a list of slots holding the terms that
+        may fill that position. Quoted parts must match word for word. Other
+        words stand alone and may be expanded: `word*` matches by prefix,
+        `*word*` by substring, `word~` fuzzily, and a plain word that is not
+        in the vocabulary falls back to a fuzzy match to tolerate typos.
+        Returns None if is_cancelled turns True along the way.
+        """
+        phrases = [[(term,) for term in tokenize(p)] for p in PHRASE_PATTERN.findall(query)]
+        for word in PHRASE_PATTERN.sub(' ', query).split():
+            if is_cancelled():
+                return None
+            tokens = tokenize(word)
+            if len(tokens) != 1:
+                phrases.append([(term,) for term in tokens])
+                continue
+            term = tokens[0]
+            with self._lock:
+                known = term in self.index['terms']
+            if word.startswith('*') and word.endswith('*'):
+                slot = self.expand_substring(term)
+            elif word.endswith('*'):
+                slot = self.expand_prefix(term)
+            elif word.endswith('~') or not known:
+                slot = self.expand_fuzzy(term, is_cancelled=is_cancelled)
+            else:
+                slot = (term,)
+            phrases.append([slot])
+        return [p for p in phrases if p]
+
+    def _lookup_trigrams(self, kind, grams):
+        """Returns the keys of a vocabulary that contain every given trigram."""
+        with self._lock:
+            gram_map = self._trigram_map(kind)
+            buckets = [gram_map.get(gram) for gram in grams]
+            if not all(buckets):
+                return set()
+            return set.intersection(*sorted(buckets, key=len))
+
+    def _most_frequent(self, kind, keys, limit=MAX_EXPANSIONS):
+        """Keeps the keys that occur in the most documents."""
+        with self._lock:
+            bucket_map = self.index[kind]
+            return tuple(heapq.nlargest(limit, keys, key=lambda key: len(bucket_map.get(key, ()))))
+
+    def expand_prefix(self, prefix, kind='terms'):
+        """Returns vocabulary keys starting with prefix, resolved through the trigram index."""
+        grams = trigrams(prefix)
+        grams.discard(prefix[-2:] + '$')
+        if len(prefix) < 2:
+            with self._lock:
+                candidates = {key for key in self.index[kind] if key.startswith(prefix)}
+        else:
+            candidates = {key for key in self._lookup_trigrams(kind, grams) if key.startswith(prefix)}
+        return self._most_frequent(kind, candidates)
+
+    def expand_substring(self, fragment, kind='terms'):
+        """Returns vocabulary keys containing fragment anywhere."""
+        if len(fragment) < 3:
+            with self._lock:
+                candidates = {key for key in self.index[kind] if fragment in key}
+        else:
+            candidates = {key for key in self._lookup_trigrams(kind, trigrams(fragment, anchored=False))
+                          if fragment in key}
+        return self._most_frequent(kind, candidates)
+
+    def expand_fuzzy(self, word, kind='terms', max_distance=None, is_cancelled=_never_cancelled):
+        """
+        Returns vocabulary keys within a small edit distance of word, closest
+        first. Candidates must share enough trigrams with the word to possibly
+        be that close (each edit changes at most three trigrams), so only a
+        small part of the vocabulary is ever compared.
+        """
+        if max_distance is None:
+            max_distance = 1 if len(word) <= 5 else 2
+        grams = trigrams(word)
+        needed = max(1, len(grams) - 3 * max_distance)
+
+        shared = {}
+        with self._lock:
+            gram_map = self._trigram_map(kind)
+            for gram in grams:
+                for key in gram_map.get(gram, ()):
+                    shared[key] = shared.get(key, 0) + 1
+            bucket_map = self.index[kind]
+            scored = []
+            for key, count in shared.items():
+                if count < needed:
+                    continue
+                if is_cancelled():
+                    return ()
+                distance = edit_distance(word, key, max_distance)
+                if distance <= max_distance:
+                    scored.append((distance, -len(bucket_map.get(key, ())), key))
+        return tuple(key for _, _, key in sorted(scored)[:MAX_EXPANSIONS])
+
+    def suggest_wikilinks(self, fragment, limit=10):
+        """
+        Suggests existing [[wikilink]] targets for a partially typed link:
+        prefix matches first, then substring matches, then fuzzy matches. Each
+        comes in the case it was written in, not as its lowercased key.
+        """
+        fragment = fragment.lower().strip()
+        if not fragment:
+            return []
+        suggestions = []
+        for candidates in (self.expand_prefix(fragment, 'wikilinks'),
+                           self.expand_substring(fragment, 'wikilinks'),
+                           self.expand_fuzzy(fragment, 'wikilinks')):
+            for key in candidates:
+                if key not in suggestions:
+                    suggestions.append(key)
+        with self._lock:
+            return [self._wikilink_form(key) for key in suggestions[:limit]]
+
+    def _wikilink_form(self, key):
+        """A wikilink key as written in the first document linking to it. Callers must hold the lock."""
+        bucket = self.index['wikilinks'].get(key)
+        if not bucket:
+            return key
+        record = self.doc_records[bucket[0]]
+        return record.link_forms[record.wikilinks.index(key)]
+
+    def _match_ids(self, phrases, is_cancelled=_never_cancelled):
+        """
+        Returns {doc_id: set(line_nums)} for documents matching every phrase.
+        Quoted phrases must match exactly; hits point at the lines where the
+        phrases or words occur. Callers must hold the lock.
+        """
+        hits_by_id = None
+        for phrase in phrases:
+            phrase_hits = self._find_phrase(phrase, is_cancelled)
+            if hits_by_id is None:
+                hits_by_id = phrase_hits
+            else:
+                hits_by_id = {doc_id: lines | phrase_hits[doc_id]
+                              for doc_id, lines in hits_by_id.items() if doc_id in phrase_hits}
+            if not hits_by_id:
+                return {}
+        return hits_by_id or {}
+
+    def rank_documents(self, query, limit=50, is_cancelled=None):
+        """
+        Scores the documents matching a query with BM25 and returns the best
+        `limit` of them as (score, path, line_nums) tuples, best first. A bounded
+        heap picks the top hits, so the full match list is never sorted.
+        is_cancelled is polled while terms are expanded, phrases verified and
+        documents scored; once it returns True the ranking gives up with [].
+        """
+        is_cancelled = is_cancelled or _never_cancelled
+        phrases = self._parse_query(query, is_cancelled)
+        if phrases is None:
+            return []
+        query_terms = {term for phrase in phrases for slot in phrase for term in slot}
+
+        with self._lock:
+            matches = self._match_ids(phrases, is_cancelled)
+            if not matches or is_cancelled():
+                return []
+            doc_count = len(self.doc_ids)
+            avg_length = self.total_length / doc_count if doc_count else 0
+            idf = {}
+            for term in query_terms:
+                df = len(self.index['terms'].get(term, ()))
+                idf[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+            def score(doc_id):
+                record = self.doc_records[doc_id]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * record.length / avg_length) if avg_length else BM25_K1
+                total = 0.0
+                for term in query_terms:
+                    tf = len(record.positions_of(term)) // 3
+                    total += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                return total
+
+            top = []
+            for doc_id in matches:
+                if is_cancelled():
+                    return []
+                entry = (score(doc_id), doc_id)
+                if len(top) < limit:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+            top.sort(reverse=True)
+            return [(doc_score, self.doc_paths[doc_id], sorted(matches[doc_id])) for doc_score, doc_id in top]
+
+    def _find_phrase(self, phrase, is_cancelled=_never_cancelled):
+        """Returns {doc_id: set(line_nums)} for documents containing the phrase's slots in order."""
+        buckets = []
+        for slot in phrase:
+            slot_buckets = [self.index['terms'][term] for term in slot if term in self.index['terms']]
+            if not slot_buckets:
+                return {}
+            buckets.append(union_sorted(slot_buckets) if len(slot_buckets) > 1 else slot_buckets[0])
+        # Intersect smallest first, so each step gallops through the larger list
+        buckets.sort(key=len)
+        candidates = buckets[0]
+        for bucket in buckets[1:]:
+            candidates = intersect_sorted(candidates, bucket)
+            if not candidates:
+                return {}
+
+        hits = {}
+        for doc_id in candidates:
+            if is_cancelled():
+                return {}
+            record = self.doc_records[doc_id]
+            following = [{ordinal for term in slot for ordinal in record.positions_of(term)[2::3]}
+                         for slot in phrase[1:]]
+            lines = set()
+            for term in phrase[0]:
+                first = record.positions_of(term)
+                lines.update(line_num for line_num, ordinal in zip(first[0::3], first[2::3])
+                             if all(ordinal + i in ordinals for i, ordinals in enumerate(following, start=1)))
+            if lines:
+                hits[doc_id] = lines
+        return hits
+
+    def search(self, query, max_documents=50, max_results=500, on_batch=None, is_cancelled=None, batch_size=20):
+        """
+        Answers a word or phrase query from the index. Returns result dicts with
+        the path, document name, line number, preview and BM25 score, ordered
+        best document first. Only the files that made the top documents are
+        read from disk, to build the previews.
+
+        When on_batch is given, results are also handed to it in best-first
+        batches as previews are built, the first batch right after the best
+        document. is_cancelled is polled throughout, down to each document
+        scored; once it returns True the search stops and returns what it has.
+        """
+        results = []
+        pending = []
+        for doc_score, path, line_nums in self.rank_documents(query, limit=max_documents, is_cancelled=is_cancelled):
+            if is_cancelled and is_cancelled():
+                return results
+            doc_results = self._build_results(path, line_nums, doc_score)[:max_results - len(results)]
+            results.extend(doc_results)
+            pending.extend(doc_results)
+            if on_batch and (len(pending) >= batch_size or len(results) == len(pending)):
+                on_batch(pending)
+                pending = []
+            if len(results) >= max_results:
+                break
+        if on_batch and pending:
+            on_batch(pending)
+        return results
+
+    @staticmethod
+    def _build_results(path, line_nums, doc_score):
+        """Builds the result dicts for one matching document."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except (IOError, UnicodeDecodeError):
+            lines = []
+        name = os.path.splitext(os.path.basename(path))[0]
+        results = []
+        for line_num in line_nums:
+            preview = lines[line_num - 1].strip() if line_num <= len(lines) else ""
+            results.append({
+                'path': path,
+                'name': name,
+                'line_num': line_num,
+                'preview': preview[:120],
+                'score': doc_score,
+            })
+        return results
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from spellchecker import SpellChecker
+
+# Distinct words remembered; a long novel uses well under this many.
+DEFAULT_MAX_WORDS = 50000
+
+
+class SpellCache:
+    """
+    Remembers the dictionary's known/unknown verdict for each word, so the
+    highlighter only asks the spell checker about words it has never seen.
+    The least recently used verdicts are dropped once max_words is reached.
+
+    lookup() only reads the cache and is cheap enough for the GUI thread;
+    check() consults the dictionary and is meant to run on a worker. The
+    dictionary itself is loaded by the first check().
+    """
+
+    def __init__(self, spell_checker=None, max_words=DEFAULT_MAX_WORDS):
+        self.spell_checker = spell_checker
+        self.max_words = max_words
+        self.verdicts = OrderedDict()
+        # The cache lock is never held across a dictionary call, so lookups never wait on one
+        self._lock = threading.Lock()
+        self._checker_lock = threading.Lock()
+
+    def lookup(self, words):
+        """
+        Returns (misspelled, unchecked): the given words known to be misspelled,
+        in their original case, and the lowercased words with no verdict yet.
+        """
+        misspelled = set()
+        unchecked = set()
+        with self._lock:
+            for word in words:
+                key = word.lower()
+                known = self.verdicts.get(key)
+                if known is None:
+                    unchecked.add(key)
+                else:
+                    self.verdicts.move_to_end(key)
+                    if not known:
+                        misspelled.add(word)
+        return misspelled, unchecked
+
+    def check(self, keys):
+        """Looks lowercased words up in the dictionary, caches the verdicts and returns the unknown ones."""
+        with self._checker_lock:
+            if self.spell_checker is None:
+                self.spell_checker = SpellChecker()
+            unknown_keys = self.spell_checker.unknown(keys)
+        with self._lock:
+            for key in keys:
+                self.verdicts[key] = key not in unknown_keys
+            while len(self.verdicts) > self.max_words:
+                self.verdicts.popitem(last=False)
+        return unknown_keys
+
+    def unknown(self, words):
+        """Returns the set of the given words that are misspelled, checking unseen words synchronously."""
+        misspelled, unchecked = self.lookup(words)
+        if unchecked:
+            unknown_keys = self.check(unchecked)
+            misspelled.update(word for word in words if word.lower() in unknown_keys)
+        return misspelled
+
+
+_shared_cache = None
+
+
+def get_spell_cache():
+    """Returns the cache shared by every highlighter."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SpellCache()
+    return _shared_cache
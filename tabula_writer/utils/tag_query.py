@@ -0,0 +1,187 @@
+import re
+import os
+from array import array
+
+from .search_indexer import tokenize, intersect_sorted, union_sorted, difference_sorted
+
+# [[links]], "phrases", parentheses, then any other run of non-space characters
+TOKEN_PATTERN = re.compile(r'\[\[.*?\]\]|"[^"]*"|[()]|[^\s()]+')
+OPERATORS = ('AND', 'OR', 'NOT')
+
+
+class TagQueryError(ValueError):
+    """Raised for a malformed boolean query."""
+
+
+def is_boolean_query(text):
+    """
+    Tells whether a search box query should go to the boolean engine: it uses
+    an operator or parentheses, or names a tag or wikilink.
+    """
+    tokens = TOKEN_PATTERN.findall(text)
+    return any(token in OPERATORS or token in ('(', ')') or token.startswith(('@', '[['))
+               for token in tokens)
+
+
+def parse_query(text):
+    """
+    Parses a query such as `@draft AND [[Marcus]] NOT @cut` into a tree of
+    tuples: ('and', [nodes]), ('or', [nodes]), ('not', node) or a leaf
+    (kind, value) for tags, wikilinks, terms, prefixes and phrases.
+    Operators are upper case; words side by side are ANDed, NOT binds tightest
+    and OR loosest, and `a NOT b` reads as `a AND NOT b`.
+    """
+    parser = _Parser(TOKEN_PATTERN.findall(text))
+    node = parser.parse_or()
+    if parser.peek() is not None:
+        raise TagQueryError(f"Unexpected '{parser.peek()}'")
+    return node
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_unary()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            nodes.append(self.parse_unary())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_unary(self):
+        token = self.take()
+        if token is None:
+            raise TagQueryError("Query ends unexpectedly")
+        if token == 'NOT':
+            return ('not', self.parse_unary())
+        if token == '(':
+            node = self.parse_or()
+            if self.take() != ')':
+                raise TagQueryError("Missing ')'")
+            return node
+        if token in OPERATORS or token == ')':
+            raise TagQueryError(f"Unexpected '{token}'")
+        return _parse_operand(token)
+
+
+def _parse_operand(token):
+    if token.startswith('[['):
+        return ('wikilinks', token[2:-2].strip().lower())
+    if token.startswith('@'):
+        return ('tags', token.lower())
+    if token.startswith('"'):
+        terms = tokenize(token)
+        if not terms:
+            raise TagQueryError("Empty phrase")
+        return ('phrase', tuple(terms)) if len(terms) > 1 else ('terms', terms[0])
+    terms = tokenize(token)
+    if len(terms) != 1:
+        raise TagQueryError(f"Cannot search for '{token}'")
+    return ('prefix', terms[0]) if token.endswith('*') else ('terms', terms[0])
+
+
+class QueryEvaluator:
+    """
+    Evaluates a parsed query over a SearchIndexer's postings. Every node
+    yields an ascending array of doc ids. AND evaluates its cheapest operands
+    first, so a rare tag narrows the working set before common terms are
+    touched, and applies negated operands last as differences rather than
+    materialising their complement. Callers must hold the indexer's lock.
+    """
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+        self.index = indexer.index
+        self._universe = None
+
+    def universe(self):
+        if self._universe is None:
+            self._universe = array('I', sorted(self.indexer.doc_ids.values()))
+        return self._universe
+
+    def estimate(self, node):
+        """Upper bound on how many documents a node can match, without evaluating it."""
+        kind = node[0]
+        if kind in ('tags', 'wikilinks', 'terms'):
+            return len(self.index[kind].get(node[1], ()))
+        if kind == 'phrase':
+            return min(len(self.index['terms'].get(term, ())) for term in node[1])
+        if kind == 'prefix':
+            return sum(len(self.index['terms'][term]) for term in self.indexer.expand_prefix(node[1]))
+        if kind == 'and':
+            return min(self.estimate(child) for child in node[1])
+        if kind == 'or':
+            return sum(self.estimate(child) for child in node[1])
+        return len(self.indexer.doc_ids)
+
+    def evaluate(self, node):
+        kind = node[0]
+        if kind in ('tags', 'wikilinks', 'terms'):
+            return self.index[kind].get(node[1], array('I'))
+        if kind == 'prefix':
+            return union_sorted([self.index['terms'][term] for term in self.indexer.expand_prefix(node[1])]
+                                or [array('I')])
+        if kind == 'phrase':
+            return array('I', sorted(self.indexer._find_phrase([(term,) for term in node[1]])))
+        if kind == 'or':
+            return union_sorted([self.evaluate(child) for child in node[1]])
+        if kind == 'not':
+            return difference_sorted(self.universe(), self.evaluate(node[1]))
+        return self._evaluate_and(node[1])
+
+    def _evaluate_and(self, children):
+        positive = sorted((child for child in children if child[0] != 'not'), key=self.estimate)
+        negative = sorted((child[1] for child in children if child[0] == 'not'), key=self.estimate, reverse=True)
+
+        result = self.evaluate(positive[0]) if positive else self.universe()
+        for child in positive[1:]:
+            if not result:
+                return result
+            result = intersect_sorted(result, self.evaluate(child))
+        for child in negative:
+            if not result:
+                break
+            result = difference_sorted(result, self.evaluate(child))
+        return result
+
+
+def find_documents(indexer, text):
+    """Parses and evaluates a boolean query, returning the matching file paths."""
+    node = parse_query(text)
+    with indexer._lock:
+        return indexer.paths_for(QueryEvaluator(indexer).evaluate(node))
+
+
+def boolean_search(indexer, text, max_results=500, on_batch=None, is_cancelled=None):
+    """
+    Runs a boolean query for the search popup. Returns one result dict per
+    matching file, sorted by name, in the same shape as SearchIndexer.search
+    but without a line number. Raises TagQueryError for a malformed query.
+    """
+    paths = find_documents(indexer, text)
+    if is_cancelled and is_cancelled():
+        return []
+    results = [{'path': path, 'name': os.path.splitext(os.path.basename(path))[0],
+                'line_num': None, 'preview': '', 'score': 0.0} for path in paths]
+    results = sorted(results, key=lambda result: result['name'].lower())[:max_results]
+    if on_batch and results:
+        on_batch(results)
+    return results
@@ -9,12 +9,12 @@ class WorkerSignals(QObject):
     finished: No data
     error: tuple (exctype, value, traceback.format_exc())
     result: object data returned from processing, anything
-    progress: int indicating % progress
+    progress: object, either an int indicating % progress or a batch of partial results
     '''
     finished = pyqtSignal()
     error = pyqtSignal(tuple)
     result = pyqtSignal(object)
-    progress = pyqtSignal(int)
+    progress = pyqtSignal(object)
 
 class Worker(QRunnable):
     '''
@@ -25,6 +25,9 @@ class Worker(QRunnable):
     :type callback: function
     :param args: Arguments to pass to the callback function
     :param kwargs: Keywords to pass to the callback function
+
+    Cancellation is cooperative: cancel() only sets a flag, which the callback
+    can poll through is_cancelled. A cancelled worker never emits its result.
     '''
 
     def __init__(self, fn, *args, **kwargs):
@@ -34,6 +37,13 @@ class Worker(QRunnable):
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
 
     def run(self):
         '''
@@ -46,6 +56,7 @@ class Worker(QRunnable):
             exctype, value = sys.exc_info()[:2]
             self.signals.error.emit((exctype, value, traceback.format_exc()))
         else:
-            self.signals.result.emit(result)  # Return the result of the processing
+            if not self._cancelled:
+                self.signals.result.emit(result)  # Return the result of the processing
         finally:
             self.signals.finished.emit()  # Done